@@ -1,20 +1,2583 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
+import argparse
+import asyncio
+import bisect
+import csv
+import gc
+import heapq
+import io
+import itertools
+import json
+import mmap
+import os
+import random
+import shutil
+import struct
+from array import array
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+import queue
+import threading
+import time
 from datetime import datetime, timedelta
+from urllib.parse import unquote
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 import matplotlib.dates as mdates
-from PIL import Image, ImageTk
-import sv_ttk  # Modern theme for tkinter
+import numpy as np
+from PIL import Image
+
+try:
+    # Parquet export is optional and only offered when pyarrow is installed
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+def import_ui():
+    # Tk, its matplotlib canvas and the theme are only loaded for the window,
+    # so headless runs (--render-charts, --stress) work without a Tk install
+    global tk, ttk, messagebox, filedialog, FigureCanvasTkAgg, ImageTk, sv_ttk
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from PIL import ImageTk
+    import sv_ttk  # Modern theme for tkinter
+
+# Records are streamed to disk in chunks of this size
+EXPORT_CHUNK_SIZE = 1000
+
+# Column order for each exportable dataset
+EXPORT_FIELDS = {
+    "Sales History": ("date", "flower", "quantity", "price", "total", "condition"),
+    "Watering History": ("time", "flower", "amount", "result"),
+    "Inventory Snapshot": ("flower", "quantity", "price", "condition", "water_level",
+                           "expiry", "threshold", "last_watered"),
+}
+# Exported numeric fields; everything else (dates included) is text
+EXPORT_FIELD_KINDS = {"quantity": "int", "price": "float", "total": "float", "amount": "int",
+                      "water_level": "int", "threshold": "int"}
+
+
+def iter_inventory(items):
+    for flower, data in items:
+        record = {"flower": flower}
+        record.update(data)
+        yield record
+
+
+def iter_chunks(records, size=EXPORT_CHUNK_SIZE):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(path, fields, chunks, progress=None):
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for chunk in chunks:
+            writer.writerows(chunk)
+            written += len(chunk)
+            if progress:
+                progress(written)
+    return written
+
+
+def write_parquet(path, fields, chunks, progress=None):
+    if pa is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    
+    # A fixed schema, so the column types never depend on what the filter matched
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(f, types[EXPORT_FIELD_KINDS.get(f, "str")]) for f in fields])
+    
+    written = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pylist([{f: r.get(f) for f in fields} for r in chunk], schema=schema)
+            if writer is None:
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table)
+            written += len(chunk)
+            if progress:
+                progress(written)
+        
+        if writer is None:
+            # Nothing matched the filter; still leave a valid (empty) file behind
+            pq.write_table(schema.empty_table(), path)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+# Water lost per hour (%) by flower type; unlisted flowers use the default
+EVAPORATION_RATES = {"Rose": 4.0, "Tulip": 3.0, "Lily": 5.0, "Orchid": 1.5, "sunflower": 6.0}
+DEFAULT_EVAPORATION_RATE = 3.0
+
+# Water levels drop in steps of this many percent
+EVAPORATION_STEP = 5
+
+CONDITION_RANK = {"Wilting": 0, "Normal": 1, "Fresh": 2}
+
+
+def condition_for_water_level(level):
+    if level > 60:
+        return "Fresh"
+    elif level > 30:
+        return "Normal"
+    else:
+        return "Wilting"
+
+
+class EvaporationScheduler:
+    # Each flower has exactly one pending deadline (the time its water level
+    # reaches the next step down) kept in a min-heap. A single root.after
+    # callback is armed for the earliest deadline, so the cost is O(log n) per
+    # step regardless of how many flowers are tracked.
+    def __init__(self, root, flowers, on_change, rates=None, step=EVAPORATION_STEP, lock_for=None):
+        self.root = root
+        self.flowers = flowers
+        # Returns the lock guarding a flower's record, if it is shared
+        self.lock_for = lock_for
+        self.on_change = on_change
+        self.rates = EVAPORATION_RATES if rates is None else rates
+        self.step = step
+        
+        self.heap = []
+        # Bumped whenever a flower is rescheduled; older heap entries are stale
+        self.generation = {}
+        self.after_id = None
+        self.armed_deadline = None
+    
+    def schedule(self, flower):
+        generation = self.generation.get(flower, 0) + 1
+        self.generation[flower] = generation
+        
+        level = self.flowers[flower]["water_level"]
+        rate = self.rates.get(flower, DEFAULT_EVAPORATION_RATE)
+        if level <= 0 or rate <= 0:
+            return
+        
+        target = max(0, (int(level) - 1) // self.step * self.step)
+        deadline = time.monotonic() + (level - target) / rate * 3600
+        # Remember the starting level so a watering that lands before the
+        # entry is rescheduled is not overwritten by the old target
+        heapq.heappush(self.heap, (deadline, generation, flower, level, target))
+        
+        # Watering leaves stale entries behind; compact once they dominate
+        if len(self.heap) > 2 * len(self.generation) + 64:
+            self.heap = [entry for entry in self.heap if self.generation.get(entry[2]) == entry[1]]
+            heapq.heapify(self.heap)
+        
+        self.arm()
+    
+    def schedule_all(self):
+        for flower in self.flowers:
+            self.schedule(flower)
+    
+    def reset(self):
+        # Drop every pending deadline and start over from the current levels
+        self.generation.clear()
+        self.heap = []
+        self.schedule_all()
+    
+    def forget(self, flower):
+        self.generation.pop(flower, None)
+    
+    def arm(self):
+        if not self.heap:
+            return
+        
+        deadline = self.heap[0][0]
+        if self.after_id is not None:
+            if self.armed_deadline <= deadline:
+                return
+            self.root.after_cancel(self.after_id)
+        
+        delay = max(0, int((deadline - time.monotonic()) * 1000))
+        self.armed_deadline = deadline
+        self.after_id = self.root.after(delay, self.tick)
+    
+    def tick(self):
+        self.after_id = None
+        now = time.monotonic()
+        changed = []
+        
+        while self.heap and self.heap[0][0] <= now:
+            deadline, generation, flower, level, target = heapq.heappop(self.heap)
+            if self.generation.get(flower) != generation or flower not in self.flowers:
+                continue
+            
+            if self.lock_for is not None:
+                with self.lock_for(flower):
+                    evaporated = self.evaporate(flower, level, target)
+            else:
+                evaporated = self.evaporate(flower, level, target)
+            
+            if evaporated:
+                changed.append(flower)
+            self.schedule(flower)
+        
+        if changed:
+            self.on_change(changed)
+        self.arm()
+    
+    def evaporate(self, flower, level, target):
+        # Returns False when the level moved since the entry was scheduled
+        data = self.flowers.get(flower)
+        if data is None or data["water_level"] != level:
+            return False
+        data["water_level"] = target
+        
+        # Evaporation can only make a flower's condition worse
+        condition = condition_for_water_level(target)
+        if CONDITION_RANK[condition] < CONDITION_RANK.get(data["condition"], 2):
+            data["condition"] = condition
+        return True
+
+# Status bar timings (seconds) and limits
+NOTIFICATION_DISPLAY_TIME = 5.0
+NOTIFICATION_MIN_TIME = 1.0
+NOTIFICATION_REFRESH_TIME = 0.2
+NOTIFICATION_QUEUE_SIZE = 20
+NOTIFICATION_HISTORY_SIZE = 200
+
+
+class NotificationQueue:
+    # Status bar messages, shown one at a time from a single root.after
+    # timer. A message posted again under the same key while it is waiting or
+    # on screen is merged into it: with a summary such as "Recorded {count}
+    # sales" the count is shown, otherwise the newest text replaces the old.
+    # A message stays up for display_time, or min_time when others wait; at
+    # most max_pending wait, the oldest being dropped. Merges only mark the
+    # label dirty and it is redrawn at most every refresh_time, so bursts of
+    # events cost a dict lookup each.
+    def __init__(self, root, show, idle_text="Ready", display_time=NOTIFICATION_DISPLAY_TIME,
+                 min_time=NOTIFICATION_MIN_TIME, refresh_time=NOTIFICATION_REFRESH_TIME,
+                 max_pending=NOTIFICATION_QUEUE_SIZE, history_size=NOTIFICATION_HISTORY_SIZE):
+        self.root = root
+        self.show = show
+        self.idle_text = idle_text
+        self.display_time = display_time
+        self.min_time = min_time
+        self.refresh_time = refresh_time
+        self.max_pending = max_pending
+        
+        # Entries are [key, message, summary, count, first posted]
+        self.pending = OrderedDict()
+        self.current = None
+        self.shown_at = 0
+        self.dirty = False
+        self.dropped = 0
+        
+        # Finished notifications as (first posted, final text), newest last
+        self.history = deque(maxlen=history_size)
+        
+        self.after_id = None
+        self.armed_deadline = None
+    
+    def post(self, message, key=None, summary=None):
+        key = message if key is None else key
+        if self.current is not None and self.current[0] == key:
+            entry = self.current
+            self.dirty = True
+            
+            # Keep a busy message up, unless others are waiting their turn
+            if not self.pending:
+                self.shown_at = time.monotonic()
+        else:
+            entry = self.pending.get(key)
+        
+        if entry is not None:
+            entry[1] = message
+            entry[3] += 1
+        else:
+            self.pending[key] = [key, message, summary, 1, datetime.now()]
+            if len(self.pending) > self.max_pending:
+                self.retire(self.pending.popitem(last=False)[1])
+                self.dropped += 1
+        
+        self.arm(time.monotonic() + (self.refresh_time if self.current is not None else 0))
+    
+    def text(self, entry):
+        _, message, summary, count, _ = entry
+        if count > 1 and summary is not None:
+            return summary.format(count=count)
+        return message
+    
+    def retire(self, entry):
+        if self.history.maxlen:
+            self.history.append((entry[4], self.text(entry)))
+    
+    def arm(self, deadline):
+        if self.after_id is not None:
+            if self.armed_deadline <= deadline:
+                return
+            self.root.after_cancel(self.after_id)
+        
+        delay = max(0, int((deadline - time.monotonic()) * 1000))
+        self.armed_deadline = deadline
+        self.after_id = self.root.after(delay, self.tick)
+    
+    def tick(self):
+        self.after_id = None
+        now = time.monotonic()
+        
+        if self.current is not None and now - self.shown_at >= self.display_limit():
+            self.retire(self.current)
+            self.current = None
+            self.dirty = True
+        
+        if self.current is None and self.pending:
+            self.current = self.pending.popitem(last=False)[1]
+            self.shown_at = now
+            self.dirty = True
+        
+        if self.dirty:
+            self.dirty = False
+            self.show(self.text(self.current) if self.current is not None else self.idle_text)
+        
+        if self.current is not None:
+            self.arm(self.shown_at + self.display_limit())
+    
+    def display_limit(self):
+        return self.min_time if self.pending else self.display_time
+    
+    def recent(self):
+        # History plus whatever is on screen or waiting, oldest first
+        entries = list(self.history)
+        for entry in ([self.current] if self.current is not None else []) + list(self.pending.values()):
+            entries.append((entry[4], self.text(entry)))
+        entries.sort(key=lambda item: item[0])
+        return entries
+
+
+# Flower pictures are looked up as <image dir>/<flower><extension>
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp")
+THUMBNAIL_SIZE = (32, 32)
+THUMBNAIL_CACHE_SIZE = 256
+
+
+def decode_thumbnail(image_dir, flower, size=THUMBNAIL_SIZE):
+    # Find and shrink a flower's picture; None when it has none or it is
+    # unreadable. Safe to call off the Tk thread (no Tk objects involved).
+    for extension in IMAGE_EXTENSIONS:
+        path = os.path.join(image_dir, flower + extension)
+        if not os.path.exists(path):
+            continue
+        try:
+            with Image.open(path) as image:
+                # Let JPEG decode at a reduced scale instead of full size
+                image.draft("RGB", size)
+                image = image.convert("RGBA")
+                image.thumbnail(size)
+                return image
+        except Exception:
+            # Broken files raise OSError, but oversized or odd ones can also
+            # raise DecompressionBombError or ValueError
+            return None
+    return None
+
+
+class ThumbnailCache:
+    # Flower thumbnails decoded on demand by one background thread and kept
+    # as PhotoImages in a size-bounded LRU. PhotoImages must be made on the Tk
+    # thread, so decoded images come back through a queue that is polled only
+    # while work is outstanding. Requests are served newest first, so the
+    # rows in view load first even after fast scrolling.
+    def __init__(self, root, image_dir, on_ready, on_evict=None, size=THUMBNAIL_SIZE,
+                 max_entries=THUMBNAIL_CACHE_SIZE):
+        self.root = root
+        self.image_dir = image_dir
+        self.on_ready = on_ready
+        self.on_evict = on_evict
+        self.size = size
+        self.max_entries = max_entries
+        
+        self.photos = OrderedDict()
+        self.pending = set()
+        # Flowers known to have no picture, so they are not looked up again
+        self.missing = set()
+        
+        self.requests = queue.LifoQueue()
+        self.results = queue.Queue()
+        self.worker = None
+        self.polling = False
+    
+    def get(self, flower):
+        # The thumbnail if cached; otherwise None, and it is loaded in the
+        # background and handed to on_ready
+        photo = self.photos.get(flower)
+        if photo is not None:
+            self.photos.move_to_end(flower)
+            return photo
+        
+        if flower not in self.pending and flower not in self.missing and self.image_dir:
+            self.pending.add(flower)
+            self.requests.put(flower)
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.run, daemon=True)
+                self.worker.start()
+            if not self.polling:
+                self.polling = True
+                self.root.after(20, self.poll)
+        return None
+    
+    def run(self):
+        while True:
+            flower = self.requests.get()
+            # Every request must produce a result, or it stays pending and
+            # poll() keeps rearming itself
+            try:
+                image = decode_thumbnail(self.image_dir, flower, self.size)
+            except Exception:
+                image = None
+            self.results.put((flower, image))
+    
+    def poll(self):
+        ready = []
+        try:
+            while True:
+                flower, image = self.results.get_nowait()
+                self.pending.discard(flower)
+                try:
+                    photo = None if image is None else ImageTk.PhotoImage(image)
+                except Exception:
+                    photo = None
+                if photo is None:
+                    self.missing.add(flower)
+                    continue
+                self.photos[flower] = photo
+                self.photos.move_to_end(flower)
+                ready.append(flower)
+        except queue.Empty:
+            pass
+        
+        while len(self.photos) > self.max_entries:
+            flower, _ = self.photos.popitem(last=False)
+            if self.on_evict is not None:
+                self.on_evict(flower)
+        
+        if ready:
+            self.on_ready(ready)
+        
+        self.polling = bool(self.pending)
+        if self.polling:
+            self.root.after(20, self.poll)
+    
+    def invalidate(self, flower=None):
+        # Forget cached pictures (all of them by default), e.g. after the
+        # files changed; they are loaded again when next shown
+        flowers = [flower] if flower is not None else list(self.photos)
+        for name in flowers:
+            if self.photos.pop(name, None) is not None and self.on_evict is not None:
+                self.on_evict(name)
+        if flower is None:
+            self.missing.clear()
+        else:
+            self.missing.discard(flower)
+
+
+# Default shelf life for a new delivery when no expiry date is given
+DEFAULT_SHELF_LIFE_DAYS = 5
+
+
+class StockLot:
+    __slots__ = ("flower", "quantity", "expiry", "seq")
+    
+    def __init__(self, flower, quantity, expiry, seq):
+        self.flower = flower
+        self.quantity = quantity
+        self.expiry = expiry
+        self.seq = seq
+
+
+class LotLedger:
+    # Stock is held as lots, one per delivery. Each flower keeps its lots in a
+    # FIFO queue (oldest delivery first) for sales, and every lot is also in a
+    # global min-heap keyed by expiry date for alerts and waste reports. Lots
+    # that are sold out or removed stay in the heap until they reach the top.
+    # Per-flower state is guarded by the caller's SKU lock; the shared heap
+    # has its own lock.
+    def __init__(self):
+        self.lots = {}
+        self.totals = {}
+        self.expiry_heap = []
+        self.seq = 0
+        self.heap_lock = threading.Lock()
+    
+    def new_lot(self, flower, quantity, expiry):
+        with self.heap_lock:
+            self.seq += 1
+            lot = StockLot(flower, quantity, expiry, self.seq)
+            heapq.heappush(self.expiry_heap, (expiry, lot.seq, lot))
+        self.totals[flower] = self.totals.get(flower, 0) + quantity
+        return lot
+    
+    def add_lot(self, flower, quantity, expiry):
+        lot = self.new_lot(flower, quantity, expiry)
+        self.lots.setdefault(flower, deque()).append(lot)
+        return lot
+    
+    def consume(self, flower, quantity):
+        # Take stock from the oldest lots first; returns (expiry, quantity) pairs
+        if self.totals.get(flower, 0) < quantity:
+            raise ValueError(f"Not enough {flower} in stock")
+        
+        taken = []
+        lots = self.lots[flower]
+        while quantity > 0:
+            lot = lots[0]
+            used = min(lot.quantity, quantity)
+            lot.quantity -= used
+            quantity -= used
+            taken.append((lot.expiry, used))
+            if lot.quantity == 0:
+                lots.popleft()
+        self.totals[flower] -= sum(used for _, used in taken)
+        return taken
+    
+    def restore(self, flower, taken):
+        # Undo a consume() by putting the stock back at the front of the queue
+        lots = self.lots.setdefault(flower, deque())
+        for expiry, quantity in reversed(taken):
+            if lots and lots[0].expiry == expiry:
+                lots[0].quantity += quantity
+                self.totals[flower] += quantity
+            else:
+                lots.appendleft(self.new_lot(flower, quantity, expiry))
+    
+    def total(self, flower):
+        return self.totals.get(flower, 0)
+    
+    def earliest_expiry(self, flower):
+        lots = self.lots.get(flower)
+        if not lots:
+            return None
+        return min(lot.expiry for lot in lots)
+    
+    def remove(self, flower):
+        for lot in self.lots.pop(flower, ()):
+            lot.quantity = 0
+        self.totals.pop(flower, None)
+    
+    def reset(self, flower, quantity, expiry):
+        # A manual stock correction replaces every lot with a single one
+        self.remove(flower)
+        if quantity > 0:
+            self.add_lot(flower, quantity, expiry)
+        else:
+            self.lots[flower] = deque()
+            self.totals[flower] = 0
+    
+    def clear(self):
+        with self.heap_lock:
+            self.lots.clear()
+            self.totals.clear()
+            self.expiry_heap = []
+    
+    def load(self, lots):
+        # Bulk-add (flower, quantity, expiry) lots in FIFO order; the heap is
+        # built once with heapify instead of one push per lot
+        with self.heap_lock:
+            heap = self.expiry_heap
+            seq = self.seq
+            for flower, quantity, expiry in lots:
+                seq += 1
+                lot = StockLot(flower, quantity, expiry, seq)
+                fifo = self.lots.get(flower)
+                if fifo is None:
+                    fifo = self.lots[flower] = deque()
+                fifo.append(lot)
+                self.totals[flower] = self.totals.get(flower, 0) + quantity
+                heap.append((expiry, seq, lot))
+            self.seq = seq
+            heapq.heapify(heap)
+    
+    def adopt(self, other):
+        # Take over another ledger's lots, e.g. one built from a snapshot
+        # outside the store's locks; the dicts stay the same objects
+        with self.heap_lock:
+            self.lots.clear()
+            self.lots.update(other.lots)
+            self.totals.clear()
+            self.totals.update(other.totals)
+            self.expiry_heap = other.expiry_heap
+            self.seq = other.seq
+    
+    def prune(self):
+        while self.expiry_heap and self.expiry_heap[0][2].quantity == 0:
+            heapq.heappop(self.expiry_heap)
+    
+    def expiring(self, before):
+        # Live lots expiring on or before the given date, soonest first. Walks
+        # the heap as a tree so nothing is popped: O(k log k) for k results.
+        result = []
+        with self.heap_lock:
+            self.prune()
+            heap = self.expiry_heap
+            frontier = [(heap[0][0], heap[0][1], 0)] if heap else []
+            while frontier:
+                expiry, _, i = heapq.heappop(frontier)
+                if expiry > before:
+                    break
+                lot = heap[i][2]
+                if lot.quantity > 0:
+                    result.append(lot)
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < len(heap):
+                        heapq.heappush(frontier, (heap[child][0], heap[child][1], child))
+        return result
+    
+    def discard_expired(self, today):
+        # Write off every lot whose expiry date is today or earlier; the
+        # caller must hold the locks of every flower involved
+        discarded = []
+        with self.heap_lock:
+            self.prune()
+            while self.expiry_heap and self.expiry_heap[0][0] <= today:
+                lot = heapq.heappop(self.expiry_heap)[2]
+                if lot.quantity > 0:
+                    discarded.append((lot.flower, lot.quantity, lot.expiry))
+                    self.totals[lot.flower] -= lot.quantity
+                    lot.quantity = 0
+                    self.lots[lot.flower].remove(lot)
+                self.prune()
+        return discarded
+
+
+# History record layouts: (field, kind) where kind is "time", "int", "float"
+# or "str". Times are held as epoch seconds and formatted on read.
+SALES_FIELDS = (("date", "time"), ("flower", "str"), ("quantity", "int"),
+                ("price", "float"), ("total", "float"), ("condition", "str"))
+WATERING_FIELDS = (("flower", "str"), ("amount", "int"), ("time", "time"), ("result", "str"))
+STOCK_FIELDS = (("time", "time"), ("flower", "str"), ("quantity", "int"))
+
+HISTORY_TYPECODES = {"time": "q", "int": "q", "float": "d", "str": "I"}
+
+# Records kept in memory per history log before older ones spill to disk.
+# Each spill writes half the window, so tiny windows mean a file per record.
+DEFAULT_HISTORY_WINDOW = 10000
+MIN_HISTORY_WINDOW = 100
+
+# Parsed segment ranges kept per history log for repeated chart queries
+HISTORY_SEGMENT_CACHE_SIZE = 4
+
+
+class HistoryLog:
+    # Append-only event history stored column-wise in typed arrays, with
+    # repeated strings (flower names, conditions) interned to integer codes.
+    # Records are only turned back into dicts when read.
+    #
+    # With a spill directory, at most `window` records stay in memory; once
+    # the window is full its older half is written to an append-only segment
+    # file. Segment names carry their time span so range queries only open
+    # the segments they need. Segments found in the directory at startup are
+    # picked up again.
+    #
+    # A history loaded from a snapshot becomes the log's read-only base:
+    # columns over the snapshot's memory map, older than every segment and
+    # in-memory record, which are never copied or rewritten.
+    def __init__(self, fields, name, spill_dir=None, window=DEFAULT_HISTORY_WINDOW):
+        if window < MIN_HISTORY_WINDOW:
+            raise ValueError(f"History window must be at least {MIN_HISTORY_WINDOW} records")
+        self.fields = fields
+        self.name = name
+        self.spill_dir = spill_dir
+        self.window = window
+        self.time_column = [kind for _, kind in fields].index("time")
+        
+        self.columns = [array(HISTORY_TYPECODES[kind]) for _, kind in fields]
+        self.strings = []
+        self.string_codes = {}
+        self.segments = []  # (first_ts, last_ts, count, path), oldest first
+        self.base = None
+        self.base_path = None
+        self.lock = threading.Lock()
+        
+        # Segments never change once written, so what has been read from them
+        # is kept: the columns of the last few ranges asked for, and per
+        # segment the last value per key for each (key, value) pair
+        # latest_before has been asked about
+        self.segment_cache = OrderedDict()
+        self.segment_latest = {}
+        self.base_latest = {}
+        self.latest_fields = set()
+        
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            for filename in sorted(os.listdir(spill_dir)):
+                parts = filename[:-len(".csv")].split("-")
+                if filename.endswith(".csv") and len(parts) == 5 and parts[0] == name:
+                    _, _, first_ts, last_ts, count = parts
+                    self.segments.append((int(first_ts), int(last_ts), int(count),
+                                          os.path.join(spill_dir, filename)))
+    
+    def __len__(self):
+        base = len(self.base[0]) if self.base else 0
+        return base + sum(segment[2] for segment in self.segments) + len(self.columns[0])
+    
+    def __iter__(self):
+        return self.iter_range()
+    
+    def intern(self, value):
+        code = self.string_codes.get(value)
+        if code is None:
+            code = len(self.strings)
+            self.strings.append(value)
+            self.string_codes[value] = code
+        return code
+    
+    def append(self, record, timestamp=None):
+        with self.lock:
+            self.append_row(record, timestamp)
+            if self.spill_dir and len(self.columns[0]) > self.window:
+                self.spill()
+    
+    def extend(self, records, timestamp=None):
+        with self.lock:
+            for record in records:
+                self.append_row(record, timestamp)
+            if self.spill_dir and len(self.columns[0]) > self.window:
+                self.spill()
+    
+    def append_row(self, record, timestamp):
+        for (field, kind), column in zip(self.fields, self.columns):
+            if kind == "time":
+                if timestamp is None:
+                    timestamp = datetime.strptime(record[field], "%Y-%m-%d %H:%M").timestamp()
+                column.append(int(timestamp))
+            elif kind == "str":
+                column.append(self.intern(record[field]))
+            else:
+                column.append(record[field])
+    
+    def decode(self, columns, strings, i):
+        record = {}
+        for (field, kind), column in zip(self.fields, columns):
+            value = column[i]
+            if kind == "time":
+                value = datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M")
+            elif kind == "str":
+                value = strings[value]
+            record[field] = value
+        return record
+    
+    def spill(self):
+        # Move the older half of the in-memory window into a new segment
+        count = len(self.columns[0]) - self.window // 2
+        times = self.columns[self.time_column]
+        filename = f"{self.name}-{len(self.segments):06d}-{times[0]}-{times[count - 1]}-{count}.csv"
+        path = os.path.join(self.spill_dir, filename)
+        
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for i in range(count):
+                writer.writerow([self.strings[column[i]] if kind == "str" else column[i]
+                                 for (_, kind), column in zip(self.fields, self.columns)])
+        
+        self.segments.append((times[0], times[count - 1], count, path))
+        for key, value in self.latest_fields:
+            self.segment_latest[path, key, value] = self.latest_in_columns(
+                self.columns, self.strings, key, value, count)
+        for column in self.columns:
+            del column[:count]
+    
+    def read_segment(self, path, start, end):
+        converters = {"time": int, "int": int, "float": float, "str": str}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                values = [converters[kind](value) for (_, kind), value in zip(self.fields, row)]
+                timestamp = values[self.time_column]
+                if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                    record = dict(zip((field for field, _ in self.fields), values))
+                    record_time = self.fields[self.time_column][0]
+                    record[record_time] = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+                    yield record
+    
+    def iter_range(self, start=None, end=None):
+        # Records with start <= time < end (epoch seconds), oldest first.
+        # Works on a snapshot, so appends made while iterating are not seen.
+        with self.lock:
+            base = self.base
+            segments = list(self.segments)
+            columns = [column[:] for column in self.columns]
+            strings = list(self.strings)
+        
+        if base:
+            lo, hi = self.bounds(base[self.time_column], start, end)
+            for i in range(lo, hi):
+                yield self.decode(base, strings, i)
+        
+        for first_ts, last_ts, _, path in segments:
+            if (start is None or last_ts >= start) and (end is None or first_ts < end):
+                yield from self.read_segment(path, start, end)
+        
+        # In-memory times are in append order, so the range is a bisection
+        lo, hi = self.bounds(columns[self.time_column], start, end)
+        for i in range(lo, hi):
+            yield self.decode(columns, strings, i)
+    
+    @staticmethod
+    def bounds(times, start, end):
+        # Index range of start <= time < end in a column of ascending times
+        lo = 0 if start is None else bisect.bisect_left(times, start)
+        hi = len(times) if end is None else bisect.bisect_left(times, end)
+        return lo, hi
+    
+    def snapshot_columns(self):
+        # Every record, from the base, segments and memory, as typed columns
+        # plus the string table their codes refer to. A one-off full read, so
+        # it is not kept in the segment cache.
+        return self.columns_between(cache=False)
+    
+    def columns_between(self, start=None, end=None, cache=True):
+        # Records with start <= time < end as typed columns plus the string
+        # table their codes refer to, without building a dict per record
+        with self.lock:
+            segments = [segment for segment in self.segments
+                        if (start is None or segment[1] >= start) and (end is None or segment[0] < end)]
+            lo, hi = self.bounds(self.columns[self.time_column], start, end)
+            memory = [column[lo:hi] for column in self.columns]
+            strings = list(self.strings)
+            mapped = self.base
+        
+        # The base is copied straight out of the map
+        columns = [array(HISTORY_TYPECODES[kind]) for _, kind in self.fields]
+        if mapped:
+            lo, hi = self.bounds(mapped[self.time_column], start, end)
+            for column, view in zip(columns, mapped):
+                column.frombytes(view[lo:hi].cast("B"))
+        
+        # Charts redraw the same range over and over, so the segment part is
+        # only parsed again when the segments it covers change. Its string
+        # codes extend the log's own table as it was when it was read.
+        if segments:
+            key = (None if start is None or start <= segments[0][0] else start,
+                   None if end is None or end > segments[-1][1] else end,
+                   tuple(path for _, _, _, path in segments))
+            with self.lock:
+                cached = self.segment_cache.get(key)
+                if cached is not None:
+                    self.segment_cache.move_to_end(key)
+            if cached is None:
+                cached = (len(strings), *self.read_segments(segments, start, end, strings))
+                if cache:
+                    with self.lock:
+                        self.segment_cache[key] = cached
+                        while len(self.segment_cache) > HISTORY_SEGMENT_CACHE_SIZE:
+                            self.segment_cache.popitem(last=False)
+            base, spilled, spilled_strings = cached
+        else:
+            base, spilled_strings = len(strings), strings
+            spilled = [array(HISTORY_TYPECODES[kind]) for _, kind in self.fields]
+        
+        # Strings only the segments knew were numbered after the log's table
+        # as it was then; give them the log's codes as of now
+        remap = list(range(base))
+        string_codes = {value: code for code, value in enumerate(strings)}
+        for value in spilled_strings[base:]:
+            code = string_codes.get(value)
+            if code is None:
+                code = string_codes[value] = len(strings)
+                strings.append(value)
+            remap.append(code)
+        
+        for (_, kind), column, spilled_column, part in zip(self.fields, columns, spilled, memory):
+            if kind == "str" and remap[base:] != list(range(base, len(remap))):
+                column.extend(map(remap.__getitem__, spilled_column))
+            else:
+                column.extend(spilled_column)
+            column.extend(part)
+        return columns, strings
+    
+    def read_segments(self, segments, start, end, strings):
+        # Parse the given segments' records in [start, end) into typed
+        # columns, interning strings on top of a copy of `strings`
+        strings = list(strings)
+        string_codes = {value: code for code, value in enumerate(strings)}
+        columns = [array(HISTORY_TYPECODES[kind]) for _, kind in self.fields]
+        converters = {"time": int, "int": int, "float": float}
+        for _, _, _, path in segments:
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.reader(f):
+                    timestamp = int(row[self.time_column])
+                    if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+                        continue
+                    for (_, kind), column, value in zip(self.fields, columns, row):
+                        if kind == "str":
+                            code = string_codes.get(value)
+                            if code is None:
+                                code = string_codes[value] = len(strings)
+                                strings.append(value)
+                            column.append(code)
+                        else:
+                            column.append(converters[kind](value))
+        return columns, strings
+    
+    def latest_before(self, start, key, value):
+        # The last `value` per `key` among records before `start`, e.g. each
+        # flower's stock level going into a chart range. The base and the
+        # segments wholly before `start` are summarised once; only the part
+        # straddling it and the in-memory window are looked at again.
+        with self.lock:
+            self.latest_fields.add((key, value))
+            base = self.base
+            strings = self.strings
+            segments = [segment for segment in self.segments if segment[0] < start]
+            hi = bisect.bisect_left(self.columns[self.time_column], start)
+            in_memory = self.latest_in_columns(self.columns, strings, key, value, hi)
+        
+        latest = {}
+        if base:
+            count = bisect.bisect_left(base[self.time_column], start)
+            summary = self.base_latest.get((key, value)) if count == len(base[0]) else None
+            if summary is None:
+                summary = self.latest_in_columns(base, strings, key, value, count)
+                if count == len(base[0]):
+                    with self.lock:
+                        if self.base is base:
+                            self.base_latest[key, value] = summary
+            latest.update(summary)
+        for _, last_ts, _, path in segments:
+            if last_ts >= start:
+                latest.update(self.latest_in_segment(path, key, value, start))
+                continue
+            summary = self.segment_latest.get((path, key, value))
+            if summary is None:
+                summary = self.segment_latest[path, key, value] = self.latest_in_segment(path, key, value)
+            latest.update(summary)
+        latest.update(in_memory)
+        return latest
+    
+    def latest_in_columns(self, columns, strings, key, value, count):
+        # latest_before over the first `count` records of the base or the
+        # in-memory window; the latter needs the lock held
+        fields = [field for field, _ in self.fields]
+        keys = columns[fields.index(key)][:count]
+        if self.fields[fields.index(key)][1] == "str":
+            keys = map(strings.__getitem__, keys)
+        return dict(zip(keys, columns[fields.index(value)][:count]))
+    
+    def latest_in_segment(self, path, key, value, start=None):
+        fields = [field for field, _ in self.fields]
+        key_index, value_index = fields.index(key), fields.index(value)
+        converters = {"time": int, "int": int, "float": float, "str": str}
+        convert_key = converters[self.fields[key_index][1]]
+        convert_value = converters[self.fields[value_index][1]]
+        latest = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if start is not None and int(row[self.time_column]) >= start:
+                    break
+                latest[convert_key(row[key_index])] = convert_value(row[value_index])
+        return latest
+    
+    def load_columns(self, columns, strings, path=None):
+        # Replace the whole history. The columns become the read-only base as
+        # views (over the snapshot at `path`, or over arrays), so nothing is
+        # copied or spilled again. With a spill directory the
+        # superseded segment files are moved into a "<name>-replaced" folder,
+        # which only ever holds the last history replaced and is not picked
+        # up again at startup.
+        with self.lock:
+            if self.segments:
+                archive = os.path.join(self.spill_dir, f"{self.name}-replaced")
+                shutil.rmtree(archive, ignore_errors=True)
+                os.makedirs(archive)
+                for _, _, _, segment in self.segments:
+                    os.replace(segment, os.path.join(archive, os.path.basename(segment)))
+            self.segments = []
+            self.segment_cache.clear()
+            self.segment_latest = {}
+            self.base_latest = {}
+            self.base = [memoryview(column) for column in columns] if len(columns[0]) else None
+            self.base_path = path if self.base else None
+            self.columns = [array(HISTORY_TYPECODES[kind]) for _, kind in self.fields]
+            self.strings = list(strings)
+            self.string_codes = {value: code for code, value in enumerate(self.strings)}
+    
+    def detach_base(self, path):
+        # Copy the base out of the snapshot at `path` before that file is
+        # replaced; a mapped file cannot be replaced on Windows
+        with self.lock:
+            if self.base_path is None or os.path.abspath(self.base_path) != os.path.abspath(path):
+                return
+            columns = []
+            for (_, kind), view in zip(self.fields, self.base):
+                column = array(HISTORY_TYPECODES[kind])
+                column.frombytes(view.cast("B"))
+                columns.append(memoryview(column))
+            self.base = columns
+            self.base_path = None
+    
+    def tail(self, n):
+        # The newest n unspilled records, oldest first: the in-memory window,
+        # topped up from the end of the base when nothing has spilled since
+        with self.lock:
+            size = len(self.columns[0])
+            records = [self.decode(self.columns, self.strings, i) for i in range(max(0, size - n), size)]
+            if size < n and self.base and not self.segments:
+                base = len(self.base[0])
+                records[:0] = [self.decode(self.base, self.strings, i) for i in range(max(0, base - n + size), base)]
+            return records
+
+
+# Number of lock stripes shared by all flowers in a FlowerStore
+SKU_LOCK_STRIPES = 64
+
+
+class OutOfStockError(ValueError):
+    pass
+
+
+def check_count(value, name="Quantity", limit=None):
+    # Quantities and water amounts are whole positive numbers. bool is an int
+    # subclass but never a count, and floats are refused rather than rounded.
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(f"{name} must be a whole number")
+    if value <= 0:
+        raise ValueError(f"{name} must be positive")
+    if limit is not None and value > limit:
+        raise ValueError(f"{name} must be at most {limit}")
+    return value
+
+
+class FlowerStore:
+    # Inventory data and the operations on it, with no UI attached. Both the
+    # window and the POS API go through these methods.
+    #
+    # Flowers (SKUs) are locked through a fixed set of lock stripes picked by
+    # hashing the name, so sales of different flowers almost never wait on
+    # each other while locking everything stays cheap however many flowers
+    # there are. Operations touching several flowers take their stripes in
+    # index order, which rules out deadlocks. Adding or removing flowers, and
+    # anything that walks every flower, also holds structure_lock so the
+    # flowers dict is never resized mid-iteration.
+    def __init__(self, flowers, sales_data, history_dir=None, history_window=DEFAULT_HISTORY_WINDOW):
+        self.flowers = flowers
+        self.sales_data = sales_data
+        self.sales_history = HistoryLog(SALES_FIELDS, "sales", history_dir, history_window)
+        self.watering_history = HistoryLog(WATERING_FIELDS, "watering", history_dir, history_window)
+        
+        # Every change to a flower's stock level, for stock-over-time charts
+        self.stock_history = HistoryLog(STOCK_FIELDS, "stock", history_dir, history_window)
+        self.histories = (self.sales_history, self.watering_history, self.stock_history)
+        
+        self.sku_locks = [threading.RLock() for _ in range(SKU_LOCK_STRIPES)]
+        self.structure_lock = threading.RLock()
+        
+        # Bumped on every change; caches compare it to spot stale data.
+        # next() on itertools.count is atomic, so no lock is needed.
+        self.version_counter = itertools.count(1)
+        self.version = 0
+        
+        # Stock is tracked per delivery lot; quantity/expiry are derived
+        self.lots = LotLedger()
+        for flower, data in self.flowers.items():
+            self.lots.add_lot(flower, data["quantity"], data["expiry"])
+            self.sales_data.setdefault(flower, [0] * 5)
+        
+        # Scanner codes (SKUs) -> flower name
+        self.sku_index = {}
+        self.index_skus()
+    
+    def lock_for(self, flower):
+        return self.sku_locks[hash(flower) % SKU_LOCK_STRIPES]
+    
+    @contextmanager
+    def locked(self, flowers):
+        stripes = sorted({hash(flower) % SKU_LOCK_STRIPES for flower in flowers})
+        self.acquire(stripes)
+        try:
+            yield
+        finally:
+            self.release(stripes)
+    
+    @contextmanager
+    def locked_all(self):
+        stripes = range(SKU_LOCK_STRIPES)
+        with self.structure_lock:
+            self.acquire(stripes)
+            try:
+                yield
+            finally:
+                self.release(stripes)
+    
+    def acquire(self, stripes):
+        for stripe in stripes:
+            self.sku_locks[stripe].acquire()
+    
+    def release(self, stripes):
+        for stripe in reversed(stripes):
+            self.sku_locks[stripe].release()
+    
+    def touch(self):
+        self.version = next(self.version_counter)
+    
+    def index_skus(self):
+        self.sku_index = self.skus_of(self.flowers)
+    
+    @staticmethod
+    def skus_of(flowers):
+        return {data["sku"]: flower for flower, data in flowers.items() if data.get("sku")}
+    
+    def lookup_sku(self, code):
+        # A scanned code is a SKU or, failing that, a flower's own name
+        flower = self.sku_index.get(code)
+        if flower is None and code in self.flowers:
+            flower = code
+        return flower
+    
+    def sync_stock(self, flower):
+        # Keep the flat quantity/expiry fields in step with the flower's lots
+        data = self.flowers[flower]
+        data["quantity"] = self.lots.total(flower)
+        data["expiry"] = self.lots.earliest_expiry(flower) or data["expiry"]
+        self.record_stock(flower, data["quantity"])
+    
+    def record_stock(self, flower, quantity):
+        self.stock_history.append({"flower": flower, "quantity": quantity}, time.time())
+    
+    def add_flower(self, name, quantity, price, expiry, threshold, sku=None):
+        with self.structure_lock, self.locked([name]):
+            if name in self.flowers:
+                raise ValueError("Flower already exists!")
+            if sku and sku in self.sku_index:
+                raise ValueError(f"SKU {sku} already belongs to {self.sku_index[sku]}")
+            
+            self.flowers[name] = {
+                "quantity": quantity,
+                "price": price,
+                "expiry": expiry,
+                "threshold": threshold,
+                "condition": "Fresh",
+                "water_level": 50,
+                "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M")
+            }
+            
+            if sku:
+                self.flowers[name]["sku"] = sku
+                self.sku_index[sku] = name
+            
+            # Initialize sales data
+            self.sales_data[name] = [0] * 5
+            self.lots.add_lot(name, quantity, expiry)
+            self.record_stock(name, quantity)
+            self.touch()
+    
+    def update_flower(self, flower, quantity, price, expiry, threshold):
+        with self.locked([flower]):
+            data = self.flowers[flower]
+            
+            # A changed count or date is a manual stock correction
+            if quantity != data["quantity"] or expiry != data["expiry"]:
+                self.lots.reset(flower, quantity, expiry)
+            
+            if quantity != data["quantity"]:
+                self.record_stock(flower, quantity)
+            
+            data.update(quantity=quantity, price=price, expiry=expiry, threshold=threshold)
+            self.touch()
+    
+    def delete_flower(self, flower):
+        self.delete_flowers([flower])
+    
+    def delete_flowers(self, flowers):
+        # Delete every listed flower or, if any is unknown, none of them
+        with self.structure_lock, self.locked(flowers):
+            for flower in flowers:
+                if flower not in self.flowers:
+                    raise KeyError(flower)
+            
+            for flower in flowers:
+                self.sku_index.pop(self.flowers[flower].get("sku"), None)
+                del self.flowers[flower]
+                self.sales_data.pop(flower, None)
+                self.lots.remove(flower)
+                self.record_stock(flower, 0)
+            self.touch()
+    
+    def set_prices(self, flowers, price=None, percent=None):
+        # Set a fixed price, or change prices by a percentage, for several
+        # flowers at once; every new price is checked before any is applied
+        with self.locked(flowers):
+            new_prices = {}
+            for flower in flowers:
+                if price is not None:
+                    new_price = price
+                else:
+                    new_price = self.flowers[flower]["price"] * (1 + percent / 100)
+                if new_price <= 0:
+                    raise ValueError(f"Price for {flower} must be positive")
+                new_prices[flower] = round(new_price, 2)
+            
+            for flower, new_price in new_prices.items():
+                self.flowers[flower]["price"] = new_price
+        self.touch()
+    
+    def sell(self, flower, quantity):
+        return self.sell_basket([(flower, quantity)])[0]
+    
+    def sell_basket(self, lines):
+        # Sell every (flower, quantity) line or none of them. Returns one sale
+        # record per flower.
+        basket = Counter()
+        for flower, quantity in lines:
+            basket[flower] += check_count(quantity)
+        
+        with self.locked(basket):
+            # Check the whole basket before touching anything
+            for flower, quantity in basket.items():
+                if self.flowers[flower]["quantity"] < quantity:
+                    raise OutOfStockError(f"Not enough stock available for {flower}")
+            
+            # Sell from the oldest lots first, remembering what was taken so a
+            # failure part way through can put everything back
+            taken = []
+            try:
+                for flower, quantity in basket.items():
+                    taken.append((flower, self.lots.consume(flower, quantity)))
+                    self.sync_stock(flower)
+            except Exception:
+                for flower, lots in reversed(taken):
+                    self.lots.restore(flower, lots)
+                    self.sync_stock(flower)
+                raise
+            
+            now = datetime.now()
+            current_time = now.strftime("%Y-%m-%d %H:%M")
+            records = []
+            for flower, quantity in basket.items():
+                data = self.flowers[flower]
+                
+                # Update sales data (keeping last 5 days)
+                sales = self.sales_data[flower]
+                sales.append(quantity)
+                if len(sales) > 5:
+                    self.sales_data[flower] = sales[-5:]
+                
+                records.append({
+                    "date": current_time,
+                    "flower": flower,
+                    "quantity": quantity,
+                    "price": data["price"],
+                    "total": data["price"] * quantity,
+                    "condition": data["condition"]
+                })
+        
+        self.sales_history.extend(records, now.timestamp())
+        self.touch()
+        return records
+    
+    def restock(self, flower, quantity, expiry=None):
+        self.restock_many({flower: quantity}, expiry)
+    
+    def restock_many(self, quantities, expiry=None, target=False):
+        # Add one lot per flower (quantities maps flower -> units) as a single
+        # transaction; everything is checked before any lot is added. With
+        # target=True the quantities are levels to fill up to, and each
+        # shortfall is worked out under the same locks. Returns the units
+        # actually added per flower.
+        if expiry is None:
+            expiry = (datetime.now() + timedelta(days=DEFAULT_SHELF_LIFE_DAYS)).strftime("%Y-%m-%d")
+        datetime.strptime(expiry, "%Y-%m-%d")
+        
+        with self.locked(quantities):
+            for flower, quantity in quantities.items():
+                if flower not in self.flowers:
+                    raise KeyError(flower)
+                check_count(quantity)
+            
+            if target:
+                added = {flower: quantity - self.flowers[flower]["quantity"]
+                         for flower, quantity in quantities.items() if self.flowers[flower]["quantity"] < quantity}
+            else:
+                added = dict(quantities)
+            
+            for flower, quantity in added.items():
+                self.lots.add_lot(flower, quantity, expiry)
+                self.sync_stock(flower)
+        self.touch()
+        return added
+    
+    def discard_expired(self, today):
+        with self.locked_all():
+            discarded = self.lots.discard_expired(today)
+            for flower in {flower for flower, _, _ in discarded}:
+                self.sync_stock(flower)
+        self.touch()
+        return discarded
+    
+    def water(self, flower, amount):
+        check_count(amount, "Amount", 100)
+        with self.locked([flower]):
+            data = self.flowers[flower]
+            data["water_level"] = min(100, data["water_level"] + amount)
+            data["condition"] = condition_for_water_level(data["water_level"])
+            now = datetime.now()
+            current_time = now.strftime("%Y-%m-%d %H:%M")
+            data["last_watered"] = current_time
+            
+            record = {
+                "flower": flower,
+                "amount": amount,
+                "time": current_time,
+                "result": "Watered" if amount > 20 else "Light watering"
+            }
+        self.watering_history.append(record, now.timestamp())
+        self.touch()
+        return record
+    
+    def water_all(self, amount=25):
+        check_count(amount, "Amount", 100)
+        with self.locked_all():
+            now = datetime.now()
+            current_time = now.strftime("%Y-%m-%d %H:%M")
+            for data in self.flowers.values():
+                data["water_level"] = min(100, data["water_level"] + amount)
+                
+                # Batch watering never marks a flower as wilting
+                if data["water_level"] > 60:
+                    data["condition"] = "Fresh"
+                elif data["water_level"] > 30:
+                    data["condition"] = "Normal"
+                data["last_watered"] = current_time
+            
+            record = {
+                "flower": "ALL",
+                "amount": amount,
+                "time": current_time,
+                "result": "Batch watered"
+            }
+        self.watering_history.append(record, now.timestamp())
+        self.touch()
+        return record
+    
+    def stock(self, flower=None):
+        if flower is not None:
+            with self.locked([flower]):
+                return dict(self.flowers[flower])
+        with self.structure_lock:
+            return {name: self.stock(name) for name in list(self.flowers)}
+    
+    def load_snapshot(self, reader):
+        # Nothing built while loading is garbage; pausing the collector during
+        # the bulk build roughly halves the load time for large stores
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.replace_contents(reader)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        self.touch()
+    
+    def replace_contents(self, reader):
+        # Replace everything with the snapshot's contents. Every section,
+        # history included, is read and checked, and the lots and SKU index
+        # built, before anything is touched, so a damaged snapshot leaves the
+        # store as it was and the locks are only held for the swap. The dicts
+        # are updated in place so anything holding a reference stays current.
+        try:
+            contents = self.read_contents(reader)
+        except (IndexError, KeyError) as e:
+            raise ValueError(f"Damaged snapshot: {e!r}") from e
+        flowers, sales_data, lots, histories = contents
+        ledger = LotLedger()
+        ledger.load(lots)
+        sku_index = self.skus_of(flowers)
+        
+        with self.locked_all():
+            self.flowers.clear()
+            self.flowers.update(flowers)
+            self.sales_data.clear()
+            self.sales_data.update(sales_data)
+            self.lots.adopt(ledger)
+            self.sku_index = sku_index
+            # Cheap: the history columns stay in the snapshot's map
+            for log, columns, strings in histories:
+                log.load_columns(columns, strings, reader.path)
+    
+    def read_contents(self, reader):
+        names = reader.strings("flower.name").all()
+        values = reader.strings("values").all()
+        columns = [reader.column(f"flower.{key}").tolist()
+                   for key in ("quantity", "price", "expiry", "threshold", "condition", "water", "watered")]
+        if any(len(column) != len(names) for column in columns):
+            raise ValueError("Snapshot flower columns differ in length")
+        
+        flowers = {
+            name: {"quantity": quantity, "price": price, "expiry": values[expiry], "threshold": threshold,
+                   "condition": values[condition], "water_level": water_level, "last_watered": values[watered]}
+            for name, quantity, price, expiry, threshold, condition, water_level, watered in zip(names, *columns)
+        }
+        
+        # Snapshots written before SKUs existed have no codes
+        if "flower.sku" in reader.sections:
+            for data, sku in zip(flowers.values(), reader.column("flower.sku").tolist()):
+                if values[sku]:
+                    data["sku"] = values[sku]
+        
+        offsets = reader.column("sales.offsets").tolist()
+        sales = reader.column("sales.values").tolist()
+        if len(offsets) != len(names) + 1:
+            raise ValueError("Snapshot sales offsets do not match the flowers")
+        sales_data = {names[i]: sales[offsets[i]:offsets[i + 1]] for i in range(len(names))}
+        
+        lots = [(names[flower], quantity, values[expiry]) for flower, quantity, expiry in zip(
+            reader.column("lot.flower").tolist(), reader.column("lot.quantity").tolist(),
+            reader.column("lot.expiry").tolist())]
+        
+        histories = []
+        for log in self.histories:
+            # Snapshots written before a log existed simply leave it empty
+            if f"{log.name}.strings" not in reader.sections:
+                histories.append((log, [array(HISTORY_TYPECODES[kind]) for _, kind in log.fields], []))
+                continue
+            columns = [reader.history_column(log.name, field, kind) for field, kind in log.fields]
+            strings = reader.strings(f"{log.name}.strings").all()
+            if len({len(column) for column in columns}) > 1:
+                raise ValueError(f"Snapshot {log.name} columns differ in length")
+            for (_, kind), column in zip(log.fields, columns):
+                if kind == "str" and len(column) and np.frombuffer(column, np.uint32).max() >= len(strings):
+                    raise ValueError(f"Snapshot {log.name} history refers to missing strings")
+            histories.append((log, columns, strings))
+        
+        return flowers, sales_data, lots, histories
+
+
+# Binary snapshot layout (little-endian):
+#   magic (8 bytes), section count (uint32), padding (uint32)
+#   one table entry per section: name (24 bytes), typecode (1 byte),
+#     padding (7 bytes), offset (uint64), length in bytes (uint64)
+#   section data, each section starting on an 8-byte boundary
+# Numeric sections are raw arrays. String tables ("s") hold NUL-terminated
+# UTF-8 strings, with start offsets in a companion "<name>.offsets" section.
+SNAPSHOT_MAGIC = b"BLOOMSN1"
+SNAPSHOT_HEADER = struct.Struct("<8sII")
+SNAPSHOT_ENTRY = struct.Struct("<24sc7xQQ")
+
+
+class SnapshotStrings:
+    # A string table read straight out of the snapshot; strings are decoded
+    # only when asked for
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+    
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __getitem__(self, i):
+        start = self.offsets[i]
+        end = self.offsets[i + 1] - 1 if i + 1 < len(self.offsets) else len(self.blob) - 1
+        return bytes(self.blob[start:end]).decode("utf-8")
+    
+    def all(self):
+        # One C-level decode and split beats decoding strings one at a time
+        if not len(self.offsets):
+            return []
+        strings = bytes(self.blob).decode("utf-8").split("\0")[:-1]
+        if len(strings) != len(self.offsets):
+            raise ValueError("Snapshot string table does not match its offsets")
+        return strings
+
+
+class SnapshotReader:
+    # Opens a snapshot through a read-only memory map. Numeric columns come
+    # back as memoryviews over the mapping (no copy, no parsing) and string
+    # tables decode lazily, so opening is independent of the data size.
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = None
+        self.view = None
+        self.views = []
+        try:
+            self.read_table(path)
+        except Exception:
+            self.close()
+            raise
+    
+    def read_table(self, path):
+        # Check the header and every section's bounds up front, so a short or
+        # damaged file is a ValueError here rather than a struct or memoryview
+        # error half way through loading
+        size = os.fstat(self.file.fileno()).st_size
+        if size < SNAPSHOT_HEADER.size:
+            raise ValueError(f"{path} is not a BloomTrack snapshot")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        
+        magic, count, _ = SNAPSHOT_HEADER.unpack_from(self.map, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a BloomTrack snapshot")
+        if SNAPSHOT_HEADER.size + count * SNAPSHOT_ENTRY.size > size:
+            raise ValueError(f"{path} is truncated")
+        
+        self.sections = {}
+        for i in range(count):
+            name, typecode, offset, length = SNAPSHOT_ENTRY.unpack_from(
+                self.map, SNAPSHOT_HEADER.size + i * SNAPSHOT_ENTRY.size)
+            name = name.rstrip(b"\0").decode("ascii")
+            typecode = typecode.decode("ascii")
+            if offset + length > size:
+                raise ValueError(f"{path} is truncated (section {name})")
+            if typecode != "s" and length % array(typecode).itemsize:
+                raise ValueError(f"{path} has a damaged section {name}")
+            self.sections[name] = (typecode, offset, length)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def section(self, name):
+        if name not in self.sections:
+            raise ValueError(f"Snapshot has no {name} section")
+        typecode, offset, length = self.sections[name]
+        view = self.view[offset:offset + length]
+        if typecode != "s":
+            view = view.cast(typecode)
+        self.views.append(view)
+        return view
+    
+    def column(self, name):
+        return self.section(name)
+    
+    def strings(self, name):
+        return SnapshotStrings(self.section(f"{name}.offsets"), self.section(name))
+    
+    def history_column(self, log, field, kind):
+        # A history column as a view in HistoryLog's typecode. It is left
+        # alone by close(): the log keeps it as its base, and the map stays
+        # open until the log lets go of it.
+        if f"{log}.{field}" not in self.sections:
+            raise ValueError(f"Snapshot has no {log}.{field} section")
+        _, offset, length = self.sections[f"{log}.{field}"]
+        typecode = HISTORY_TYPECODES[kind]
+        if length % array(typecode).itemsize:
+            raise ValueError(f"Snapshot has a damaged {log}.{field} section")
+        return self.view[offset:offset + length].cast(typecode)
+    
+    def close(self):
+        # Views over the map must be released before it can be closed. While
+        # a history log still holds one the close fails, and the map is
+        # closed instead once the last view is garbage collected.
+        for view in self.views:
+            view.release()
+        self.views = []
+        if self.view is not None:
+            self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+        self.file.close()
+
+
+def write_snapshot(store, path):
+    sections = []
+    
+    def add_strings(name, strings):
+        offsets = array("Q")
+        blob = bytearray()
+        for value in strings:
+            offsets.append(len(blob))
+            blob += value.encode("utf-8") + b"\0"
+        sections.append((f"{name}.offsets", "Q", offsets.tobytes()))
+        sections.append((name, "s", bytes(blob)))
+    
+    values = []
+    value_codes = {}
+    
+    def intern(value):
+        code = value_codes.get(value)
+        if code is None:
+            code = value_codes[value] = len(values)
+            values.append(value)
+        return code
+    
+    with store.locked_all():
+        names = list(store.flowers)
+        flower_index = {name: i for i, name in enumerate(names)}
+        
+        columns = {"quantity": array("q"), "price": array("d"), "expiry": array("q"), "threshold": array("q"),
+                   "condition": array("q"), "water": array("q"), "watered": array("q"), "sku": array("q")}
+        sales_offsets = array("Q", [0])
+        sales_values = array("q")
+        for name in names:
+            data = store.flowers[name]
+            columns["quantity"].append(data["quantity"])
+            columns["price"].append(data["price"])
+            columns["expiry"].append(intern(data["expiry"]))
+            columns["threshold"].append(data["threshold"])
+            columns["condition"].append(intern(data["condition"]))
+            columns["water"].append(int(data["water_level"]))
+            columns["watered"].append(intern(data["last_watered"]))
+            columns["sku"].append(intern(data.get("sku", "")))
+            sales_values.extend(store.sales_data.get(name, ()))
+            sales_offsets.append(len(sales_values))
+        
+        lot_flower, lot_quantity, lot_expiry = array("q"), array("q"), array("q")
+        for name in names:
+            for lot in store.lots.lots.get(name, ()):
+                lot_flower.append(flower_index[name])
+                lot_quantity.append(lot.quantity)
+                lot_expiry.append(intern(lot.expiry))
+    
+    # The history logs have their own locks, so reading them (segments
+    # included) does not hold up sales; a record made in between is simply
+    # in the snapshot too
+    histories = [(log, *log.snapshot_columns()) for log in store.histories]
+    
+    add_strings("flower.name", names)
+    add_strings("values", values)
+    for key, column in columns.items():
+        sections.append((f"flower.{key}", column.typecode, column.tobytes()))
+    sections.append(("sales.offsets", "Q", sales_offsets.tobytes()))
+    sections.append(("sales.values", "q", sales_values.tobytes()))
+    sections.append(("lot.flower", "q", lot_flower.tobytes()))
+    sections.append(("lot.quantity", "q", lot_quantity.tobytes()))
+    sections.append(("lot.expiry", "q", lot_expiry.tobytes()))
+    for log, log_columns, strings in histories:
+        add_strings(f"{log.name}.strings", strings)
+        for (field, _), column in zip(log.fields, log_columns):
+            sections.append((f"{log.name}.{field}", column.typecode, column.tobytes()))
+    
+    # Write to a temporary file and swap it in, so a crash never leaves a
+    # half-written snapshot behind
+    offset = SNAPSHOT_HEADER.size + len(sections) * SNAPSHOT_ENTRY.size
+    table = []
+    for name, typecode, data in sections:
+        offset = (offset + 7) // 8 * 8
+        table.append((name, typecode, offset, len(data)))
+        offset += len(data)
+    
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(sections), 0))
+        for name, typecode, offset, length in table:
+            f.write(SNAPSHOT_ENTRY.pack(name.encode("ascii"), typecode.encode("ascii"), offset, length))
+        for (_, _, data), (_, _, offset, _) in zip(sections, table):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(data)
+    for log in store.histories:
+        log.detach_base(path)
+    os.replace(temp_path, path)
+
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 409: "Conflict",
+                500: "Internal Server Error"}
+
+
+class PosApiServer:
+    # Small HTTP/1.1 JSON API for the shop counter terminals:
+    #   GET  /stock             all flowers
+    #   GET  /stock/<flower>    one flower
+    #   POST /sales             {"flower": ..., "quantity": ...} or
+    #                           {"items": [{"flower": ..., "quantity": ...}, ...]}
+    #   POST /restock           {"flower": ..., "quantity": ..., "expiry": optional}
+    #   POST /water             {"flower": ... or "ALL", "amount": optional}
+    # It runs its own asyncio loop on a background thread. Writes are queued
+    # and applied in batches (each under its own flower locks), and each batch
+    # posts a single list of (kind, flower) changes to the events queue.
+    def __init__(self, store, events, host="127.0.0.1", port=8765, max_batch=100):
+        self.store = store
+        self.events = events
+        self.host = host
+        self.port = port
+        self.max_batch = max_batch
+        
+        self.loop = None
+        self.thread = None
+        self.error = None
+    
+    def start(self):
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(ready,), daemon=True)
+        self.thread.start()
+        ready.wait()
+        if self.error is not None:
+            raise self.error
+        return self.port
+    
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+    
+    def run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.writes = asyncio.Queue()
+            server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+        except OSError as e:
+            self.error = e
+            ready.set()
+            self.loop.close()
+            return
+        
+        # Port 0 asks the OS for a free port; report the real one
+        self.port = server.sockets[0].getsockname()[1]
+        self.loop.create_task(self.apply_writes())
+        ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            # Drop open terminal connections along with the batcher
+            server.close()
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+    
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                
+                body = await reader.readexactly(int(headers.get("content-length") or 0))
+                status, payload = await self.dispatch(method, target, body)
+                
+                keep_alive = headers.get("connection", "").lower() != "close"
+                data = json.dumps(payload).encode("utf-8")
+                writer.write((f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(data)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            # Malformed request or the terminal hung up; just drop the connection
+            pass
+        except asyncio.CancelledError:
+            # Server is shutting down
+            pass
+        finally:
+            writer.close()
+    
+    async def dispatch(self, method, target, body):
+        path = unquote(target.split("?", 1)[0]).rstrip("/")
+        
+        if method == "GET" and path == "/stock":
+            return 200, self.store.stock()
+        if method == "GET" and path.startswith("/stock/"):
+            flower = path[len("/stock/"):]
+            try:
+                return 200, self.store.stock(flower)
+            except KeyError:
+                return 404, {"error": f"Unknown flower: {flower}"}
+        
+        if method == "POST" and path in ("/sales", "/restock", "/water"):
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                return 400, {"error": "Invalid JSON"}
+            if not isinstance(payload, dict):
+                return 400, {"error": "Expected a JSON object"}
+            
+            future = self.loop.create_future()
+            await self.writes.put((path, payload, future))
+            return await future
+        
+        return 404, {"error": f"No route for {method} {path}"}
+    
+    async def apply_writes(self):
+        while True:
+            batch = [await self.writes.get()]
+            # Let requests that arrived while the last batch ran join this one
+            await asyncio.sleep(0)
+            while len(batch) < self.max_batch and not self.writes.empty():
+                batch.append(self.writes.get_nowait())
+            
+            changes = []
+            for path, payload, future in batch:
+                try:
+                    applied, result = self.apply(path, payload)
+                except OutOfStockError as e:
+                    response = (409, {"error": str(e)})
+                except KeyError as e:
+                    response = (404, {"error": f"Unknown flower: {e.args[0]}"})
+                except (ValueError, TypeError, OverflowError) as e:
+                    response = (400, {"error": str(e)})
+                except Exception as e:
+                    # One broken request must not stop the batcher or strand
+                    # the rest of the batch
+                    response = (500, {"error": f"{type(e).__name__}: {e}"})
+                else:
+                    changes.extend(applied)
+                    response = (200, result)
+                
+                # The client may have hung up while the batch was waiting
+                if not future.done():
+                    future.set_result(response)
+            
+            if changes:
+                self.events.put(changes)
+    
+    def apply(self, path, payload):
+        # Returns the (kind, flower) changes made and the response body. Bad
+        # or missing fields raise ValueError/TypeError, which become a 400.
+        if path == "/sales" and "items" in payload:
+            items = payload["items"]
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise ValueError("'items' must be a list of objects")
+            lines = [(self.field(item, "flower", str), self.field(item, "quantity", int, 1)) for item in items]
+            records = self.store.sell_basket(lines)
+            return [("sale", record["flower"]) for record in records], records
+        
+        flower = self.field(payload, "flower", str)
+        
+        if path == "/sales":
+            return [("sale", flower)], self.store.sell(flower, self.field(payload, "quantity", int, 1))
+        if path == "/restock":
+            self.store.restock(flower, self.field(payload, "quantity", int), payload.get("expiry"))
+            return [("restock", flower)], self.store.stock(flower)
+        
+        amount = self.field(payload, "amount", int, 25)
+        if flower == "ALL":
+            return [("water", flower)], self.store.water_all(amount)
+        return [("water", flower)], self.store.water(flower, amount)
+    
+    @staticmethod
+    def field(payload, key, kind, default=None):
+        # JSON numbers like 1.9 or true are not silently turned into counts
+        value = payload.get(key, default)
+        if value is None:
+            raise ValueError(f"'{key}' is required")
+        if isinstance(value, bool) or not isinstance(value, kind):
+            raise ValueError(f"'{key}' must be {'a whole number' if kind is int else 'a string'}")
+        return value
+
+
+# Chart colors per theme, matching the window's own palette
+THEME_COLORS = {
+    "dark": {"primary": "#7E57C2", "secondary": "#26A69A", "accent": "#FF7043", "background": "#121212",
+             "card": "#1E1E1E", "text": "#FFFFFF", "alert": "#263238"},
+    "light": {"primary": "#7E57C2", "secondary": "#26A69A", "accent": "#FF7043", "background": "#F5F5F5",
+              "card": "#FFFFFF", "text": "#000000", "alert": "#FFF3E0"},
+}
+
+
+def ttk_styles(colors):
+    # Every ttk style the window uses, as (configure options, map options)
+    return {
+        "Custom.TFrame": ({"background": colors["background"]}, {}),
+        "Card.TFrame": ({"background": colors["card"], "borderwidth": 1, "relief": "solid"}, {}),
+        "Alert.TFrame": ({"background": colors["alert"], "borderwidth": 1, "relief": "solid"}, {}),
+        "TNotebook": ({"background": colors["background"]}, {}),
+        "TNotebook.Tab": ({"font": ("Segoe UI", 10, "bold"), "padding": [15, 5]}, {}),
+        "Treeview": ({"background": colors["card"], "fieldbackground": colors["card"],
+                      "foreground": colors["text"]}, {}),
+        "Inventory.Treeview": ({"rowheight": THUMBNAIL_SIZE[1] + 4}, {}),
+        "Treeview.Heading": ({"background": colors["primary"], "foreground": "white"}, {}),
+        "TButton": ({"font": ("Segoe UI", 9), "padding": 8, "background": colors["secondary"],
+                     "foreground": "white"},
+                    {"background": [('active', colors["accent"]), ('!disabled', colors["secondary"])],
+                     "foreground": [('active', 'white'), ('!disabled', 'white')]}),
+        "Accent.TButton": ({"background": colors["accent"], "foreground": "white"},
+                           {"background": [('active', colors["primary"]), ('!disabled', colors["accent"])]}),
+    }
+
+
+def matplotlib_style(colors):
+    # rcParams so anything drawn afresh (legends included) matches the theme
+    return {
+        "figure.facecolor": colors["background"],
+        "axes.facecolor": colors["card"],
+        "axes.edgecolor": colors["text"],
+        "axes.labelcolor": colors["text"],
+        "axes.titlecolor": colors["text"],
+        "xtick.color": colors["text"],
+        "ytick.color": colors["text"],
+        "text.color": colors["text"],
+        "legend.facecolor": colors["card"],
+        "legend.edgecolor": colors["text"],
+        "legend.labelcolor": colors["text"],
+    }
+
+
+# Style bundles are built once per theme rather than on every switch
+THEME_STYLES = {theme: ttk_styles(colors) for theme, colors in THEME_COLORS.items()}
+THEME_RC = {theme: matplotlib_style(colors) for theme, colors in THEME_COLORS.items()}
+
+
+def style_axes(ax, colors):
+    ax.set_facecolor(colors["card"])
+    for spine in ax.spines.values():
+        spine.set_edgecolor(colors["text"])
+    ax.tick_params(colors=colors["text"])
+    ax.yaxis.label.set_color(colors["text"])
+    ax.xaxis.label.set_color(colors["text"])
+    ax.title.set_color(colors["text"])
+
+
+def recolor_figure(fig, colors):
+    # Give an already drawn figure another theme's colors. Only existing
+    # artists are touched, so no data is reprocessed and the layout stays.
+    fig.patch.set_facecolor(colors["background"])
+    for text in fig.texts:
+        text.set_color(colors["text"])
+    for ax in fig.axes:
+        style_axes(ax, colors)
+        
+        # Bar value labels and empty-chart notes are drawn in the old text color
+        for text in ax.texts:
+            text.set_color(colors["text"])
+        legend = ax.get_legend()
+        if legend is not None:
+            legend.get_frame().set_facecolor(colors["card"])
+            legend.get_frame().set_edgecolor(colors["text"])
+            for text in legend.get_texts():
+                text.set_color(colors["text"])
+
+
+def draw_stock_chart(ax, flowers, colors):
+    names = list(flowers.keys())
+    quantities = [data["quantity"] for data in flowers.values()]
+    thresholds = [data["threshold"] for data in flowers.values()]
+    
+    x = range(len(names))
+    bar_width = 0.35
+    
+    # Stock levels bars
+    bars = ax.bar(x, quantities, bar_width, color=colors["primary"], label='Current Stock')
+    threshold_bars = ax.bar([i + bar_width for i in x], thresholds, bar_width, 
+                            color=colors["secondary"], label='Restock Threshold')
+    
+    ax.set_title("Current Stock vs Restock Threshold", color=colors["text"])
+    ax.set_xticks([i + bar_width / 2 for i in x])
+    ax.set_xticklabels(names, rotation=45, ha="right")
+    ax.legend()
+    
+    # Add value labels on bars
+    for bar in bars + threshold_bars:
+        height = bar.get_height()
+        ax.text(bar.get_x() + bar.get_width()/2., height,
+                f'{int(height)}',
+                ha='center', va='bottom', color=colors["text"])
+    
+    style_axes(ax, colors)
+
+
+# Sales Trends ranges: name -> (days shown, bucket size in seconds)
+SALES_TREND_RANGES = {
+    "Week": (7, 3600),
+    "Month": (30, 3600),
+    "Year": (365, 86400),
+}
+SALES_TREND_TOP_N = (5, 10, 20, 50)
+DEFAULT_SALES_TREND_RANGE = "Week"
+DEFAULT_SALES_TREND_TOP_N = 10
+
+
+# History analytics: bucket sizes in seconds and ranges in days
+ANALYTICS_BUCKETS = {"Hour": 3600, "Day": 86400, "Week": 7 * 86400}
+ANALYTICS_RANGES = {"Day": 1, "Week": 7, "Month": 30, "Year": 365}
+DEFAULT_ANALYTICS_RANGE = "Week"
+DEFAULT_ANALYTICS_BUCKET = "Hour"
+
+
+def history_arrays(log, start=None, end=None):
+    # A time range of a history log as numpy arrays keyed by field, plus the
+    # string table the "str" fields index into. Numeric arrays are views over
+    # the typed columns rather than copies.
+    columns, strings = log.columns_between(start, end)
+    arrays = {}
+    for (field, kind), column in zip(log.fields, columns):
+        values = np.frombuffer(column, dtype=column.typecode)
+        
+        # Widen string codes so they can be combined with bucket numbers
+        arrays[field] = values.astype(np.int64) if kind == "str" else values
+    return arrays, strings
+
+
+def analytics_window(range_name=DEFAULT_ANALYTICS_RANGE, bucket_name=DEFAULT_ANALYTICS_BUCKET, now=None):
+    # (start, bucket size, bucket count) for a range ending now; ranges start
+    # at local midnight so day buckets line up with calendar days
+    bucket = ANALYTICS_BUCKETS[bucket_name]
+    now = now or datetime.now()
+    start = int(datetime.combine(now.date() - timedelta(days=ANALYTICS_RANGES[range_name] - 1),
+                                 datetime.min.time()).timestamp())
+    count = int((now.timestamp() - start) // bucket) + 1
+    return start, bucket, count
+
+
+def flower_rows(strings, names, batch=None):
+    # Heatmap row for every interned string: -1 for strings that are not a
+    # current flower, len(names) for the batch marker
+    rows = {name: i for i, name in enumerate(names)}
+    if batch is not None:
+        rows[batch] = len(names)
+    return np.array([rows.get(value, -1) for value in strings] or [-1], dtype=np.int64)
+
+
+def watering_heatmap(log, names, start, bucket, count):
+    # Waterings per flower (rows) and bucket (columns). A batch watering
+    # counts for every flower.
+    arrays, strings = history_arrays(log, start, start + bucket * count)
+    rows = flower_rows(strings, names, batch="ALL")[arrays["flower"]]
+    column = (arrays["time"] - start) // bucket
+    keep = rows >= 0
+    
+    counts = np.bincount(rows[keep] * count + column[keep],
+                         minlength=(len(names) + 1) * count).reshape(len(names) + 1, count)
+    return counts[:-1] + counts[-1]
+
+
+def stock_levels(log, flowers, start, bucket, count):
+    # Stock level per flower (rows) at the end of each bucket (columns),
+    # carried forward from the last change at or before it; NaN where no
+    # level is known yet. The last level before the range seeds its first
+    # bucket, so only the range itself is read.
+    names = list(flowers)
+    arrays, strings = history_arrays(log, start, start + bucket * count)
+    rows = flower_rows(strings, names)[arrays["flower"]]
+    column = (arrays["time"] - start) // bucket
+    keep = rows >= 0
+    cells = rows[keep] * count + column[keep]
+    quantities = arrays["quantity"][keep]
+    
+    # Records are in time order, so a cell's level is its last record
+    cells, last = np.unique(cells[::-1], return_index=True)
+    levels = np.full(len(names) * count, -1, dtype=np.int64)
+    levels[cells] = quantities[::-1][last]
+    levels = levels.reshape(len(names), count)
+    seed = log.latest_before(start, "flower", "quantity")
+    first = levels[:, 0]
+    first[first < 0] = [seed.get(names[row], -1) for row in np.flatnonzero(first < 0)]
+    
+    # Carry each level forward through the buckets with no change
+    known = np.where(levels >= 0, np.arange(count), 0)
+    np.maximum.accumulate(known, axis=1, out=known)
+    levels = np.take_along_axis(levels, known, axis=1).astype(float)
+    levels[levels < 0] = np.nan
+    
+    # A flower with no recorded changes has held its current level throughout
+    for row in np.flatnonzero(np.isnan(levels).all(axis=1)):
+        levels[row] = flowers[names[row]]["quantity"]
+    return levels
+
+
+def draw_heatmap(ax, names, values, start, bucket, colors, title, label):
+    # Flowers down the side, time along the bottom; the image is resampled to
+    # the axes size when drawn, so very long ranges cost no more to show
+    end = start + bucket * values.shape[1]
+    extent = (mdates.date2num(datetime.fromtimestamp(start)), mdates.date2num(datetime.fromtimestamp(end)),
+              len(names) - 0.5, -0.5)
+    image = ax.imshow(values, aspect="auto", interpolation="nearest", cmap="viridis", extent=extent)
+    
+    ax.xaxis_date()
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    if len(names) <= 40:
+        ax.set_yticks(range(len(names)))
+        ax.set_yticklabels(names)
+    else:
+        ax.set_yticks([])
+    ax.set_title(title, color=colors["text"])
+    
+    colorbar = ax.figure.colorbar(image, ax=ax)
+    colorbar.set_label(label, color=colors["text"])
+    colorbar.ax.tick_params(colors=colors["text"])
+    
+    style_axes(ax, colors)
+
+
+def draw_history_chart(ax, store, view, range_name, bucket_name, colors):
+    start, bucket, count = analytics_window(range_name, bucket_name)
+    flowers = store.stock()
+    names = list(flowers)
+    if view == "Stock Levels":
+        values = stock_levels(store.stock_history, flowers, start, bucket, count)
+        label = "Units in stock"
+    else:
+        values = watering_heatmap(store.watering_history, names, start, bucket, count)
+        label = "Waterings"
+    draw_heatmap(ax, names, values, start, bucket, colors,
+                 f"{view} per {bucket_name} (Past {range_name})", label)
+
+
+def sales_trend_series(history, range_name=DEFAULT_SALES_TREND_RANGE, top_n=DEFAULT_SALES_TREND_TOP_N, now=None):
+    # Units sold per time bucket for the top_n best selling flowers over the
+    # range, as {flower: (bucket start times, units)} plus a chart title.
+    # The series is empty when nothing was sold in the range.
+    days, bucket = SALES_TREND_RANGES[range_name]
+    now = now or datetime.now()
+    start = int(datetime.combine(now.date() - timedelta(days=days - 1), datetime.min.time()).timestamp())
+    count = int((now.timestamp() - start) // bucket) + 1
+    
+    arrays, strings = history_arrays(history, start)
+    column = (arrays["date"] - start) // bucket
+    keep = column < count
+    units = np.bincount(arrays["flower"][keep] * count + column[keep], weights=arrays["quantity"][keep],
+                        minlength=len(strings) * count).reshape(len(strings), count).astype(np.int64)
+    totals = units.sum(axis=1)
+    
+    xs = [start + i * bucket for i in range(count)]
+    top = np.argsort(-totals, kind="stable")[:top_n]
+    series = {strings[code]: (xs, units[code].tolist()) for code in top if totals[code] > 0}
+    return series, f"Sales Trends (Past {range_name})"
+
+
+def downsample_lttb(xs, ys, threshold):
+    # Largest-Triangle-Three-Buckets: keep the first and last points and,
+    # from each bucket in between, the point forming the largest triangle
+    # with the point kept before it and the average of the next bucket
+    size = len(xs)
+    if threshold >= size or threshold < 3:
+        return xs, ys
+    
+    every = (size - 2) / (threshold - 2)
+    out_x = [xs[0]]
+    out_y = [ys[0]]
+    kept = 0
+    for i in range(threshold - 2):
+        lo = int(i * every) + 1
+        hi = int((i + 1) * every) + 1
+        next_hi = min(max(int((i + 2) * every) + 1, hi + 1), size)
+        avg_x = sum(xs[hi:next_hi]) / (next_hi - hi)
+        avg_y = sum(ys[hi:next_hi]) / (next_hi - hi)
+        
+        kept_x, kept_y = xs[kept], ys[kept]
+        best_area = -1
+        for j in range(lo, hi):
+            area = abs((kept_x - avg_x) * (ys[j] - kept_y) - (kept_x - xs[j]) * (avg_y - kept_y))
+            if area > best_area:
+                best_area = area
+                kept = j
+        out_x.append(xs[kept])
+        out_y.append(ys[kept])
+    
+    out_x.append(xs[-1])
+    out_y.append(ys[-1])
+    return out_x, out_y
+
+
+def draw_sales_chart(ax, series, colors, title):
+    # The axes cannot show more than one point per pixel, so each line is
+    # cut down to the axes width before plotting
+    ax.set_title(title, color=colors["text"])
+    ax.grid(True, linestyle='--', alpha=0.7)
+    if not series:
+        ax.text(0.5, 0.5, "No sales in this range", transform=ax.transAxes,
+                ha="center", va="center", color=colors["text"])
+        ax.set_xticks([])
+        ax.set_yticks([])
+        style_axes(ax, colors)
+        return
+    
+    width = int(ax.bbox.width)
+    for flower, (xs, ys) in series.items():
+        xs, ys = downsample_lttb(xs, ys, width)
+        ax.plot([datetime.fromtimestamp(x) for x in xs], ys,
+                marker='o' if len(xs) <= 31 else None, label=flower)
+    
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax.legend(fontsize="small", ncol=max(1, len(series) // 10))
+    
+    style_axes(ax, colors)
+
+
+def draw_watering_chart(ax, watering_history, flowers, colors):
+    if watering_history:
+        # Prepare data for last 7 days
+        today = datetime.now()
+        dates = [today - timedelta(days=i) for i in range(6, -1, -1)]
+        flower_counts = {flower: [0]*7 for flower in flowers.keys()}
+        
+        for entry in watering_history:
+            # Batch waterings and deleted flowers have no bar of their own
+            if entry["flower"] not in flower_counts:
+                continue
+            entry_date = datetime.strptime(entry["time"], "%Y-%m-%d %H:%M")
+            for i, date in enumerate(dates):
+                if entry_date.date() == date.date():
+                    flower_counts[entry["flower"]][i] += 1
+                    break
+        
+        bottom = [0]*7
+        for flower in flowers.keys():
+            counts = flower_counts[flower]
+            if sum(counts) > 0:  # Only show flowers with watering activity
+                ax.bar([d.strftime("%a") for d in dates], counts, 
+                       bottom=bottom, label=flower)
+                bottom = [bottom[j] + counts[j] for j in range(7)]
+        
+        ax.set_title("Watering Activity (Last 7 Days)", color=colors["text"])
+        ax.legend()
+    
+    style_axes(ax, colors)
+
+
+class ChartRenderer:
+    # Draws the analytics charts off-screen on the Agg backend, so no Tk
+    # window is needed, and caches the encoded images by chart, format, size,
+    # theme, the store's data version and the time bucket the chart ends in.
+    # Repeated views and scheduled reports reuse the cached bytes until the
+    # data changes or the chart's time window moves on.
+    CHARTS = ("stock", "sales", "watering", "stock_levels", "watering_heatmap")
+    
+    def __init__(self, store, max_entries=32):
+        self.store = store
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+    
+    def period(self, chart):
+        # Charts of a range ending now change as time passes even when the
+        # data does not; this names the bucket (hour or day) now falls in
+        if chart == "stock":
+            return None
+        if chart == "watering":
+            bucket = 86400
+        elif chart == "sales":
+            bucket = SALES_TREND_RANGES[DEFAULT_SALES_TREND_RANGE][1]
+        else:
+            bucket = ANALYTICS_BUCKETS[DEFAULT_ANALYTICS_BUCKET]
+        return datetime.now().strftime("%Y-%m-%d %H" if bucket < 86400 else "%Y-%m-%d")
+    
+    def render(self, chart, theme="dark", fmt="png", size=(10, 5), dpi=100):
+        version = (self.store.version, self.period(chart))
+        key = (chart, theme, fmt, size, dpi)
+        with self.cache_lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[0] == version:
+                self.cache.move_to_end(key)
+                return cached[1]
+        
+        colors = THEME_COLORS[theme]
+        with plt.rc_context(THEME_RC[theme]):
+            fig = Figure(figsize=size, dpi=dpi)
+            FigureCanvasAgg(fig)
+            ax = fig.add_subplot()
+            
+            # Draw from copies so sales can continue while the chart renders
+            if chart == "stock":
+                draw_stock_chart(ax, self.store.stock(), colors)
+            elif chart == "sales":
+                series, title = sales_trend_series(self.store.sales_history)
+                draw_sales_chart(ax, series, colors, title)
+            elif chart == "watering":
+                draw_watering_chart(ax, self.store.watering_history.tail(50), self.store.stock(), colors)
+            elif chart == "stock_levels":
+                draw_history_chart(ax, self.store, "Stock Levels", DEFAULT_ANALYTICS_RANGE,
+                                   DEFAULT_ANALYTICS_BUCKET, colors)
+            elif chart == "watering_heatmap":
+                draw_history_chart(ax, self.store, "Watering Frequency", DEFAULT_ANALYTICS_RANGE,
+                                   DEFAULT_ANALYTICS_BUCKET, colors)
+            else:
+                raise ValueError(f"Unknown chart: {chart}")
+            
+            fig.tight_layout()
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, facecolor=fig.get_facecolor())
+            image = buffer.getvalue()
+        
+        # Only the newest version of each chart is worth keeping
+        with self.cache_lock:
+            self.cache[key] = (version, image)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return image
+    
+    def render_all(self, directory, theme="dark", fmt="png"):
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for chart in self.CHARTS:
+            path = os.path.join(directory, f"{chart}.{fmt}")
+            with open(path, "wb") as f:
+                f.write(self.render(chart, theme, fmt))
+            paths.append(path)
+        return paths
+
+
+def sample_flowers():
+    return {
+        "Rose": {"quantity": 50, "expiry": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"), 
+                "threshold": 20, "condition": "Fresh", "water_level": 80, "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M"), "price": 2.99, "sku": "1001"},
+        "Tulip": {"quantity": 30, "expiry": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"), 
+                 "threshold": 15, "condition": "Fresh", "water_level": 60, "last_watered": (datetime.now() - timedelta(hours=2)).strftime("%Y-%m-%d %H:%M"), "price": 1.99, "sku": "1002"},
+        "Lily": {"quantity": 25, "expiry": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"), 
+                "threshold": 10, "condition": "Wilting", "water_level": 20, "last_watered": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M"), "price": 3.49, "sku": "1003"},
+        "Orchid": {"quantity": 15, "expiry": (datetime.now() + timedelta(days=4)).strftime("%Y-%m-%d"), 
+                  "threshold": 5, "condition": "Fresh", "water_level": 70, "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M"), "price": 4.99, "sku": "1004"},
+        "sunflower": {"quantity": 25, "expiry": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"), 
+                     "threshold": 10, "condition": "Wilting", "water_level": 20, "last_watered": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M"), "price": 3.49, "sku": "1005"},
+    }
+
+
+def sample_sales_data():
+    return {
+        "Rose": [10, 12, 15, 8, 20],
+        "Tulip": [5, 8, 6, 10, 7],
+        "Lily": [3, 5, 7, 4, 6],
+        "Orchid": [2, 3, 4, 5, 2]
+    }
+
+
+def run_sale_stress(threads=8, baskets=5000, flowers=50, stock=2000):
+    # Hammer one store with random multi-line baskets from many threads, then
+    # check that no flower was oversold and every unit sold is accounted for.
+    # Returns a list of problems found (empty when everything adds up).
+    names = [f"SKU{i:04d}" for i in range(flowers)]
+    expiry = (datetime.now() + timedelta(days=DEFAULT_SHELF_LIFE_DAYS)).strftime("%Y-%m-%d")
+    store = FlowerStore({name: {"quantity": stock, "expiry": expiry, "threshold": 10, "condition": "Fresh",
+                                "water_level": 80, "last_watered": "", "price": 1.0}
+                         for name in names}, {})
+    
+    sold = Counter()
+    sold_lock = threading.Lock()
+    
+    def worker(seed):
+        rng = random.Random(seed)
+        local = Counter()
+        for _ in range(baskets):
+            lines = [(rng.choice(names), rng.randint(1, 5)) for _ in range(rng.randint(1, 4))]
+            try:
+                for record in store.sell_basket(lines):
+                    local[record["flower"]] += record["quantity"]
+            except OutOfStockError:
+                pass
+        with sold_lock:
+            sold.update(local)
+    
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    problems = []
+    for name in names:
+        remaining = store.flowers[name]["quantity"]
+        if remaining < 0 or remaining != store.lots.total(name) or remaining + sold[name] != stock:
+            problems.append(f"{name}: {remaining} left after selling {sold[name]} of {stock}")
+    
+    history = Counter()
+    for record in store.sales_history:
+        history[record["flower"]] += record["quantity"]
+    if history != sold:
+        problems.append("Sales history does not match the units sold")
+    
+    print(f"{threads * baskets} baskets on {threads} threads in {elapsed:.2f}s "
+          f"({threads * baskets / elapsed:.0f} baskets/s), {sum(sold.values())} units sold")
+    return problems
+
+
+# Soak-test events per minute at an average point of the day. Sales arrive
+# as bursts of customers, so the sale rate counts bursts, not single sales.
+SOAK_RATES = {"sale": 6, "water_all": 0.2, "restock": 1, "edit": 0.5}
+SOAK_BURST = (1, 6)
+
+# How busy the shop is through the day, as multipliers of SOAK_RATES; the
+# soak run is spread over one such day (quiet morning, lunch and evening peaks)
+SOAK_DAY_PROFILE = (0.4, 0.7, 1.0, 2.2, 1.6, 0.8, 0.7, 1.2, 2.0, 0.9)
+SOAK_REPORT_INTERVAL = 60
+
+
+def percentile(values, fraction):
+    # values must be sorted
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def resident_memory():
+    # Resident set size in bytes, where the platform exposes it cheaply
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def history_window(value):
+    # argparse type for --history-window
+    try:
+        window = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid window: {value!r}")
+    if window < MIN_HISTORY_WINDOW:
+        raise argparse.ArgumentTypeError(f"must be at least {MIN_HISTORY_WINDOW} records")
+    return window
+
+
+def soak_rate(item):
+    # argparse type for --soak-rate EVENT=PER_MIN
+    kind, _, rate = item.partition("=")
+    if kind not in SOAK_RATES:
+        raise argparse.ArgumentTypeError(f"unknown soak event: {kind}")
+    try:
+        per_minute = float(rate)
+    except ValueError:
+        per_minute = None
+    # The comparison also rejects nan
+    if per_minute is None or not 0 <= per_minute < float("inf"):
+        raise argparse.ArgumentTypeError(f"invalid rate for {kind}: {rate!r}")
+    return kind, per_minute
+
+
+class SoakTest:
+    # Drives a running ModernFlowerInventory through a scripted shop day,
+    # calling the same methods as its buttons and dialogs. Each event gets a
+    # due time on the Tk loop; its latency runs from the due time to the
+    # first idle callback after the handler. Tk redraws are idle callbacks
+    # queued by the handler itself, so that point is after the repaint, and
+    # a timer firing late because the loop was stalled counts as well.
+    def __init__(self, app, minutes, rates=None, seed=0, report_interval=SOAK_REPORT_INTERVAL, on_done=None):
+        self.app = app
+        self.root = app.root
+        self.duration = minutes * 60
+        self.rates = dict(SOAK_RATES, **(rates or {}))
+        self.rng = random.Random(seed)
+        self.report_interval = report_interval
+        self.on_done = on_done
+        
+        self.latencies = {kind: [] for kind in (*self.rates, "sale_line")}
+        self.reported = {kind: 0 for kind in self.latencies}
+        self.started = None
+        self.start_memory = None
+        self.start_objects = None
+        self.finished = False
+    
+    def start(self):
+        self.started = time.perf_counter()
+        self.start_memory = resident_memory()
+        self.start_objects = len(gc.get_objects())
+        for kind in self.rates:
+            self.schedule(kind)
+        self.root.after(self.report_interval * 1000, self.report)
+    
+    def elapsed(self):
+        return time.perf_counter() - self.started
+    
+    def schedule(self, kind, delay=None):
+        if delay is None:
+            # Poisson arrivals at the rate for the current part of the day
+            hour = min(int(self.elapsed() / self.duration * len(SOAK_DAY_PROFILE)), len(SOAK_DAY_PROFILE) - 1)
+            rate = self.rates[kind] * SOAK_DAY_PROFILE[hour] / 60
+            if rate <= 0:
+                return
+            delay = self.rng.expovariate(rate)
+        if self.elapsed() + delay < self.duration:
+            delay_ms = int(delay * 1000)
+            self.root.after(delay_ms, self.fire, kind, time.perf_counter() + delay_ms / 1000)
+    
+    def fire(self, kind, due):
+        if self.finished:
+            return
+        getattr(self, f"do_{kind}")()
+        self.root.after_idle(lambda: self.latencies[kind].append(time.perf_counter() - due))
+        if kind != "sale_line":
+            self.schedule(kind)
+    
+    def do_sale(self):
+        # A burst of customers queueing at the till, a second or two apart
+        self.do_sale_line()
+        for i in range(self.rng.randint(*SOAK_BURST) - 1):
+            self.schedule("sale_line", (i + 1) * self.rng.uniform(0.5, 2))
+    
+    def do_sale_line(self):
+        quantity = self.rng.randint(1, 5)
+        in_stock = [flower for flower, data in self.app.flowers.items() if data["quantity"] >= quantity]
+        if not in_stock:
+            self.do_restock()
+            return
+        self.app.flower_var.set(self.rng.choice(in_stock))
+        self.app.quantity_var.set(quantity)
+        self.app.record_sale()
+    
+    def do_water_all(self):
+        self.app.water_all_flowers()
+    
+    def do_restock(self):
+        # What the restock dialog does for "Restock All Low Stock"
+        low = [flower for flower, data in self.app.flowers.items() if data["quantity"] <= data["threshold"]]
+        flowers = low or [self.rng.choice(list(self.app.flowers))]
+        quantities = {flower: self.rng.randint(20, 100) for flower in flowers}
+        self.app.store.restock_many(quantities)
+        self.app.refresh_inventory_rows(quantities)
+        self.app.check_alerts()
+    
+    def do_edit(self):
+        # A small price correction, as saved by the update dialog
+        flower = self.rng.choice(list(self.app.flowers))
+        self.app.store.set_prices([flower], percent=self.rng.uniform(-5, 5))
+        self.app.update_inventory_display()
+        self.app.check_alerts()
+    
+    def report(self):
+        elapsed = self.elapsed()
+        print(f"--- soak {elapsed / 60:.1f} of {self.duration / 60:.1f} min ---")
+        for kind, values in self.latencies.items():
+            if not values:
+                continue
+            recent = sorted(values[self.reported[kind]:])
+            values = sorted(values)
+            self.reported[kind] = len(values)
+            print(f"{kind:<10} n={len(values):<7} p50={percentile(values, 0.5) * 1000:7.1f}ms "
+                  f"p95={percentile(values, 0.95) * 1000:7.1f}ms p99={percentile(values, 0.99) * 1000:7.1f}ms "
+                  f"max={values[-1] * 1000:7.1f}ms  (last interval p99={percentile(recent, 0.99) * 1000:.1f}ms)")
+        
+        memory = resident_memory()
+        objects = len(gc.get_objects())
+        growth = f"{(memory - self.start_memory) / 2**20:+.1f} MiB RSS, " if memory and self.start_memory else ""
+        print(f"memory: {growth}{objects - self.start_objects:+d} tracked objects")
+        
+        if elapsed >= self.duration:
+            self.finished = True
+            if self.on_done is not None:
+                self.on_done()
+            return
+        self.root.after(int(min(self.report_interval, self.duration - elapsed + 1) * 1000), self.report)
+
 
 class ModernFlowerInventory:
-    def __init__(self, root):
+    def __init__(self, root, history_dir=None, history_window=DEFAULT_HISTORY_WINDOW, image_dir=None):
+        import_ui()
         self.root = root
         self.root.title("BloomTrack - Modern Flower Inventory")
         self.root.geometry("1300x800")
         
         # Set dark theme by default
-        sv_ttk.set_theme("dark")
+        self.theme = "dark"
+        self.styled_themes = set()
+        sv_ttk.set_theme(self.theme)
         
         # Custom colors
         self.primary_color = "#7E57C2"  # Deep purple
@@ -25,83 +2588,96 @@ class ModernFlowerInventory:
         self.text_color = "#FFFFFF"  # White text
         
         # Sample initial data
-        self.flowers = {
-            "Rose": {"quantity": 50, "expiry": (datetime.now() + timedelta(days=3)).strftime("%Y-%m-%d"), 
-                    "threshold": 20, "condition": "Fresh", "water_level": 80, "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M"), "price": 2.99},
-            "Tulip": {"quantity": 30, "expiry": (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d"), 
-                     "threshold": 15, "condition": "Fresh", "water_level": 60, "last_watered": (datetime.now() - timedelta(hours=2)).strftime("%Y-%m-%d %H:%M"), "price": 1.99},
-            "Lily": {"quantity": 25, "expiry": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"), 
-                    "threshold": 10, "condition": "Wilting", "water_level": 20, "last_watered": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M"), "price": 3.49},
-            "Orchid": {"quantity": 15, "expiry": (datetime.now() + timedelta(days=4)).strftime("%Y-%m-%d"), 
-                      "threshold": 5, "condition": "Fresh", "water_level": 70, "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M"), "price": 4.99},
-        "sunflower": {"quantity": 25, "expiry": (datetime.now() + timedelta(days=2)).strftime("%Y-%m-%d"), 
-                    "threshold": 10, "condition": "Wilting", "water_level": 20, "last_watered": (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d %H:%M"), "price": 3.49},
-        }
-        
-        self.sales_data = {
-            "Rose": [10, 12, 15, 8, 20],
-            "Tulip": [5, 8, 6, 10, 7],
-            "Lily": [3, 5, 7, 4, 6],
-            "Orchid": [2, 3, 4, 5, 2]
-        }
-        
-        self.watering_history = []
-        self.sales_history = []
+        self.flowers = sample_flowers()
+        self.sales_data = sample_sales_data()
+        
+        # Data and core operations shared by the window and the POS API
+        self.store = FlowerStore(self.flowers, self.sales_data, history_dir, history_window)
+        self.watering_history = self.store.watering_history
+        self.sales_history = self.store.sales_history
+        self.stock_history = self.store.stock_history
+        self.lots = self.store.lots
+        self.chart_renderer = ChartRenderer(self.store)
+        
+        # Changes made by POS terminals, drained on the Tk thread
+        self.api_events = queue.Queue()
+        self.api_server = None
+        
+        # Background export state
+        self.export_thread = None
+        self.export_queue = queue.Queue()
+        
+        # Flower pictures, decoded only for rows that are actually shown
+        if image_dir is None:
+            image_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+        self.thumbnails = ThumbnailCache(self.root, image_dir if os.path.isdir(image_dir) else None,
+                                         self.on_thumbnails_ready, self.on_thumbnail_evicted)
+        self.thumbnails_scheduled = False
+        
+        # Current stock and water alert per flower, so an evaporation step
+        # only re-checks the flowers that changed
+        self.stock_alerts = {}
+        self.water_alerts = {}
         
         self.setup_ui()
         self.check_alerts()
         
+        # Water evaporates over time; one timer drives every flower
+        self.evaporation = EvaporationScheduler(self.root, self.flowers, self.on_evaporation,
+                                                lock_for=self.store.lock_for)
+        self.evaporation.schedule_all()
+        
         # Bind theme toggle to F1 key
         self.root.bind("<F1>", self.toggle_theme)
     
     def toggle_theme(self, event=None):
-        current_theme = sv_ttk.get_theme()
-        new_theme = "light" if current_theme == "dark" else "dark"
-        sv_ttk.set_theme(new_theme)
+        self.theme = "light" if self.theme == "dark" else "dark"
+        sv_ttk.set_theme(self.theme)
         
         # Update colors based on theme
-        if new_theme == "dark":
-            self.bg_color = "#121212"
-            self.card_color = "#1E1E1E"
-            self.text_color = "#FFFFFF"
-        else:
-            self.bg_color = "#F5F5F5"
-            self.card_color = "#FFFFFF"
-            self.text_color = "#000000"
+        colors = THEME_COLORS[self.theme]
+        self.bg_color = colors["background"]
+        self.card_color = colors["card"]
+        self.text_color = colors["text"]
         
         # Update UI elements
+        self.apply_theme_styles()
         self.update_ui_colors()
     
+    def apply_theme_styles(self):
+        # ttk keeps style settings per theme, so each theme's bundle only has
+        # to be configured the first time that theme is used
+        if self.theme in self.styled_themes:
+            return
+        for name, (options, state_options) in THEME_STYLES[self.theme].items():
+            self.style.configure(name, **options)
+            if state_options:
+                self.style.map(name, **state_options)
+        self.styled_themes.add(self.theme)
+    
     def update_ui_colors(self):
+        colors = THEME_COLORS[self.theme]
+        
         # Update background colors
         self.root.configure(bg=self.bg_color)
-        for tab in [self.inventory_tab, self.sales_tab, self.analytics_tab, self.watering_tab]:
-            tab.configure(style="Custom.TFrame")
-        
-        # Update treeview styles
-        self.style.configure("Treeview", background=self.card_color, fieldbackground=self.card_color, foreground=self.text_color)
-        self.style.configure("Treeview.Heading", background=self.primary_color, foreground="white")
-        
-        # Update button styles
-        self.style.configure("TButton", background=self.secondary_color, foreground="white")
-        self.style.map("TButton", 
-                      background=[('active', self.accent_color), ('!disabled', self.secondary_color)],
-                      foreground=[('active', 'white'), ('!disabled', 'white')])
-        
-        # Update alert frame
-        self.alerts_frame.configure(bg="#FFF3E0" if sv_ttk.get_theme() == "light" else "#263238")
-        self.alerts_label.configure(bg="#FFF3E0" if sv_ttk.get_theme() == "light" else "#263238")
-        
-        # Redraw plots with updated colors
-        self.update_analytics_plot()
+        for label in (self.title_label, self.date_label, self.status_label):
+            label.configure(background=self.bg_color)
+        
+        # Update alert card
+        self.alerts_title.configure(background=colors["alert"])
+        self.alerts_label.configure(background=colors["alert"])
+        
+        # Recolor the existing charts and let each redraw once when idle; no
+        # chart is rebuilt and no data is read again
+        for fig, canvas in ((self.stock_fig, self.stock_canvas), (self.sales_fig, self.sales_canvas),
+                            (self.water_fig, self.water_canvas), (self.history_fig, self.history_canvas)):
+            recolor_figure(fig, colors)
+            canvas.draw_idle()
     
     def setup_ui(self):
         # Custom style configuration
         self.style = ttk.Style()
-        self.style.configure("Custom.TFrame", background=self.bg_color)
-        self.style.configure("TNotebook", background=self.bg_color)
-        self.style.configure("TNotebook.Tab", font=("Segoe UI", 10, "bold"), padding=[15, 5])
-        self.style.configure("TButton", font=("Segoe UI", 9), padding=8)
+        self.apply_theme_styles()
         
         # Header
         self.header = ttk.Frame(self.root, style="Custom.TFrame")
@@ -115,6 +2691,12 @@ class ModernFlowerInventory:
                                    font=("Segoe UI", 10), background=self.bg_color)
         self.date_label.pack(side="right")
         
+        # Snapshot save/open
+        ttk.Button(self.header, text="📂 Open Snapshot", command=self.open_snapshot,
+                  style="TButton").pack(side="right", padx=5)
+        ttk.Button(self.header, text="💾 Save Snapshot", command=self.save_snapshot,
+                  style="TButton").pack(side="right", padx=5)
+        
         # Create tabs
         self.tab_control = ttk.Notebook(self.root, style="TNotebook")
         
@@ -146,13 +2728,20 @@ class ModernFlowerInventory:
         self.status_label = ttk.Label(self.status_bar, text="Ready", background=self.bg_color)
         self.status_label.pack(side="left", padx=10)
         
-        # Update UI colors based on theme
-        self.update_ui_colors()
+        # One queue and one timer for every status message; click for history
+        self.notifications = NotificationQueue(self.root, lambda text: self.status_label.config(text=text))
+        self.status_label.bind("<Button-1>", lambda e: self.show_notification_history())
+        
+        self.root.configure(bg=self.bg_color)
     
     def setup_inventory_tab(self):
         # Inventory Treeview with modern styling
         columns = ("Flower", "Quantity", "Price", "Condition", "Water Level", "Expiry Date", "Threshold")
-        self.inventory_tree = ttk.Treeview(self.inventory_tab, columns=columns, show="headings", selectmode="browse", style="Treeview")
+        self.inventory_tree = ttk.Treeview(self.inventory_tab, columns=columns, show="tree headings", selectmode="extended", style="Inventory.Treeview")
+        
+        # The tree column holds the flower's thumbnail
+        self.inventory_tree.heading("#0", text="")
+        self.inventory_tree.column("#0", width=THUMBNAIL_SIZE[0] + 16, stretch=False, anchor="center")
         
         # Configure columns
         col_widths = [120, 80, 80, 100, 100, 120, 100]
@@ -162,7 +2751,13 @@ class ModernFlowerInventory:
         
         # Add scrollbar
         scrollbar = ttk.Scrollbar(self.inventory_tab, orient="vertical", command=self.inventory_tree.yview)
-        self.inventory_tree.configure(yscrollcommand=scrollbar.set)
+        
+        # Scrolling (or resizing) brings new rows into view; load their pictures
+        def on_tree_scroll(first, last):
+            scrollbar.set(first, last)
+            self.schedule_thumbnails()
+        
+        self.inventory_tree.configure(yscrollcommand=on_tree_scroll)
         scrollbar.pack(side="right", fill="y")
         self.inventory_tree.pack(pady=20, padx=10, fill="both", expand=True)
         
@@ -179,7 +2774,9 @@ class ModernFlowerInventory:
             ("✏️ Update", self.update_flower),
             ("🗑️ Delete", self.delete_flower),
             ("📦 Restock", self.restock_flowers),
+            ("♻️ Waste", self.show_waste_report),
             ("💦 Water All", self.water_all_flowers),
+            ("📤 Export", self.export_data),
             ("🔄 Refresh", self.refresh_data)
         ]
         
@@ -192,17 +2789,14 @@ class ModernFlowerInventory:
         self.alerts_frame = ttk.Frame(self.inventory_tab, style="Alert.TFrame")
         self.alerts_frame.pack(pady=10, padx=10, fill="x")
         
-        ttk.Label(self.alerts_frame, text="🚨 Alerts", font=("Segoe UI", 10, "bold"), 
-                 background="#263238", foreground="white").pack(pady=5, fill="x")
+        self.alerts_title = ttk.Label(self.alerts_frame, text="🚨 Alerts", font=("Segoe UI", 10, "bold"), 
+                                     background=THEME_COLORS[self.theme]["alert"], foreground="white")
+        self.alerts_title.pack(pady=5, fill="x")
         
         self.alerts_label = ttk.Label(self.alerts_frame, text="", foreground="white", 
-                                     wraplength=600, background="#263238", font=("Segoe UI", 9), 
+                                     wraplength=600, background=THEME_COLORS[self.theme]["alert"], font=("Segoe UI", 9), 
                                      justify="left")
         self.alerts_label.pack(pady=5, padx=10, fill="x")
-        
-        # Configure custom styles
-        self.style.configure("Card.TFrame", background=self.card_color, borderwidth=1, relief="solid")
-        self.style.configure("Alert.TFrame", background="#263238", borderwidth=1, relief="solid")
     
     def setup_watering_tab(self):
         # Watering system controls in a card
@@ -269,11 +2863,6 @@ class ModernFlowerInventory:
         self.watering_tree.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side="right", fill="y")
         self.watering_tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
-        
-        # Configure accent button style
-        self.style.configure("Accent.TButton", background=self.accent_color, foreground="white")
-        self.style.map("Accent.TButton", 
-                      background=[('active', self.primary_color), ('!disabled', self.accent_color)])
     
     def water_selected_flower(self):
         flower = self.water_flower_var.get()
@@ -283,29 +2872,9 @@ class ModernFlowerInventory:
         
         water_amount = self.water_amount_var.get()
         
-        # Update water level
-        self.flowers[flower]["water_level"] = min(100, self.flowers[flower]["water_level"] + water_amount)
-        
-        # Update condition based on water level
-        if self.flowers[flower]["water_level"] > 60:
-            self.flowers[flower]["condition"] = "Fresh"
-        elif self.flowers[flower]["water_level"] > 30:
-            self.flowers[flower]["condition"] = "Normal"
-        else:
-            self.flowers[flower]["condition"] = "Wilting"
-        
-        # Update last watered time
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-        self.flowers[flower]["last_watered"] = current_time
-        
-        # Add to watering history
-        result = "Watered" if water_amount > 20 else "Light watering"
-        self.watering_history.append({
-            "flower": flower,
-            "amount": water_amount,
-            "time": current_time,
-            "result": result
-        })
+        # Update water level, condition and watering history
+        self.store.water(flower, water_amount)
+        self.evaporation.schedule(flower)
         
         # Update displays
         self.update_inventory_display()
@@ -321,7 +2890,7 @@ class ModernFlowerInventory:
             self.watering_tree.delete(item)
         
         # Add history entries in reverse chronological order
-        for entry in reversed(self.watering_history[-50:]):  # Show last 50 entries
+        for entry in reversed(self.watering_history.tail(50)):  # Show last 50 entries
             self.watering_tree.insert("", "end", values=(
                 entry["flower"],
                 f"{entry['amount']}%",
@@ -330,27 +2899,9 @@ class ModernFlowerInventory:
             ))
     
     def water_all_flowers(self):
-        for flower in self.flowers:
-            # Add 25% water to all flowers
-            self.flowers[flower]["water_level"] = min(100, self.flowers[flower]["water_level"] + 25)
-            
-            # Update condition
-            if self.flowers[flower]["water_level"] > 60:
-                self.flowers[flower]["condition"] = "Fresh"
-            elif self.flowers[flower]["water_level"] > 30:
-                self.flowers[flower]["condition"] = "Normal"
-            
-            # Update last watered time
-            self.flowers[flower]["last_watered"] = datetime.now().strftime("%Y-%m-%d %H:%M")
-        
-        # Add to watering history
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-        self.watering_history.append({
-            "flower": "ALL",
-            "amount": 25,
-            "time": current_time,
-            "result": "Batch watered"
-        })
+        # Add 25% water to all flowers
+        self.store.water_all(25)
+        self.evaporation.schedule_all()
         
         self.update_inventory_display()
         self.update_watering_history()
@@ -361,29 +2912,86 @@ class ModernFlowerInventory:
         for item in self.inventory_tree.get_children():
             self.inventory_tree.delete(item)
         
-        # Add current data with color coding for condition
+        # Add current data with color coding for condition; rows are keyed by
+        # flower name so single rows can be refreshed in place
         for flower, data in self.flowers.items():
-            condition = data["condition"]
-            water_level = data["water_level"]
-            
-            # Determine tag based on condition
-            if condition == "Fresh":
-                tag = "fresh"
-            elif condition == "Wilting":
-                tag = "wilting"
-            else:
-                tag = "normal"
-            
-            self.inventory_tree.insert("", "end", values=(
-                flower, 
-                data["quantity"], 
-                f"${data['price']:.2f}",
-                condition,
-                f"{water_level}%",
-                data["expiry"], 
-                data["threshold"]
-            ), tags=(tag,))
+            values, tag = self.inventory_row(flower, data)
+            self.inventory_tree.insert("", "end", iid=flower, values=values, tags=(tag,))
+        
+        self.schedule_thumbnails()
+        self.update_water_level_label()
+    
+    def inventory_row(self, flower, data):
+        condition = data["condition"]
+        
+        # Determine tag based on condition
+        if condition == "Fresh":
+            tag = "fresh"
+        elif condition == "Wilting":
+            tag = "wilting"
+        else:
+            tag = "normal"
+        
+        values = (
+            flower, 
+            data["quantity"], 
+            f"${data['price']:.2f}",
+            condition,
+            f"{data['water_level']}%",
+            data["expiry"], 
+            data["threshold"]
+        )
+        return values, tag
+    
+    def refresh_inventory_rows(self, flowers):
+        for flower in flowers:
+            if flower in self.flowers and self.inventory_tree.exists(flower):
+                values, tag = self.inventory_row(flower, self.flowers[flower])
+                self.inventory_tree.item(flower, values=values, tags=(tag,))
+        self.update_water_level_label()
+    
+    def schedule_thumbnails(self):
+        # Many scroll events can arrive per frame; handle them once when idle
+        if not self.thumbnails_scheduled:
+            self.thumbnails_scheduled = True
+            self.root.after_idle(self.show_visible_thumbnails)
+    
+    def show_visible_thumbnails(self):
+        self.thumbnails_scheduled = False
+        rows = self.inventory_tree.get_children()
+        if not rows:
+            return
         
+        # The tree is flat, so its scroll fractions map straight to row indices
+        first, last = self.inventory_tree.yview()
+        start = int(first * len(rows))
+        end = min(len(rows), int(last * len(rows)) + 1)
+        for flower in rows[start:end]:
+            photo = self.thumbnails.get(flower)
+            if photo is not None:
+                self.inventory_tree.item(flower, image=photo)
+    
+    def on_thumbnails_ready(self, flowers):
+        for flower in flowers:
+            # poll() may already have evicted it again to stay within size
+            photo = self.thumbnails.photos.get(flower)
+            if photo is not None and self.inventory_tree.exists(flower):
+                self.inventory_tree.item(flower, image=photo)
+        if self.flower_var.get() in flowers:
+            self.update_sale_thumbnail()
+    
+    def on_thumbnail_evicted(self, flower):
+        # Rows drop their picture before the PhotoImage goes away
+        if self.inventory_tree.exists(flower):
+            self.inventory_tree.item(flower, image="")
+        if self.flower_var.get() == flower:
+            self.sale_thumbnail.configure(image="")
+    
+    def update_sale_thumbnail(self):
+        photo = self.thumbnails.get(self.flower_var.get())
+        self.sale_thumbnail.configure(image=photo if photo is not None else "")
+    
+    def update_water_level_label(self):
         # Update the current water level display if on watering tab
         if hasattr(self, 'water_flower_var'):
             selected_flower = self.water_flower_var.get()
@@ -393,6 +3001,10 @@ class ModernFlowerInventory:
                     foreground=self.get_water_level_color(self.flowers[selected_flower]['water_level'])
                 )
     
+    def on_evaporation(self, flowers):
+        self.refresh_inventory_rows(flowers)
+        self.check_alerts(flowers)
+    
     def get_water_level_color(self, level):
         if level > 60:
             return "#4CAF50"  # Green
@@ -404,7 +3016,7 @@ class ModernFlowerInventory:
     def add_flower(self):
         add_window = tk.Toplevel(self.root)
         add_window.title("Add New Flower")
-        add_window.geometry("400x450")
+        add_window.geometry("400x520")
         
         # Use theme for the window
         for child in add_window.winfo_children():
@@ -422,7 +3034,8 @@ class ModernFlowerInventory:
             ("Initial Quantity:", "spinbox", (0, 1000, 50)),
             ("Price ($):", "spinbox_float", (0.01, 100, 2.99)),
             ("Expiry Date (YYYY-MM-DD):", "entry", datetime.now().strftime("%Y-%m-%d")),
-            ("Restock Threshold:", "spinbox", (1, 100, 20))
+            ("Restock Threshold:", "spinbox", (1, 100, 20)),
+            ("SKU / Barcode (optional):", "entry", "")
         ]
         
         self.form_vars = []
@@ -459,18 +3072,10 @@ class ModernFlowerInventory:
                 # Validate date format
                 datetime.strptime(expiry, "%Y-%m-%d")
                 
-                self.flowers[name] = {
-                    "quantity": quantity,
-                    "price": price,
-                    "expiry": expiry,
-                    "threshold": threshold,
-                    "condition": "Fresh",
-                    "water_level": 50,
-                    "last_watered": datetime.now().strftime("%Y-%m-%d %H:%M")
-                }
+                sku = self.form_vars[5].get().strip() or None
                 
-                # Initialize sales data
-                self.sales_data[name] = [0] * 5
+                self.store.add_flower(name, quantity, price, expiry, threshold, sku)
+                self.evaporation.schedule(name)
                 
                 self.update_inventory_display()
                 self.update_analytics_plot()
@@ -484,12 +3089,19 @@ class ModernFlowerInventory:
         save_btn.pack(pady=20)
     
     def update_flower(self):
+        # With several rows selected, edit their prices together
+        if len(self.inventory_tree.selection()) > 1:
+            self.update_prices(list(self.inventory_tree.selection()))
+            return
+        
         selected = self.inventory_tree.focus()
         if not selected:
             messagebox.showerror("Error", "Please select a flower to update")
             return
         
-        flower = self.inventory_tree.item(selected)["values"][0]
+        # Rows are keyed by flower name; the displayed values are not safe
+        # to use, as Tk turns numeric-looking names into ints
+        flower = selected
         data = self.flowers[flower]
         
         update_window = tk.Toplevel(self.root)
@@ -543,15 +3155,7 @@ class ModernFlowerInventory:
                 # Validate date format
                 datetime.strptime(expiry, "%Y-%m-%d")
                 
-                self.flowers[flower] = {
-                    "quantity": quantity,
-                    "price": price,
-                    "expiry": expiry,
-                    "threshold": threshold,
-                    "condition": data["condition"],
-                    "water_level": data["water_level"],
-                    "last_watered": data["last_watered"]
-                }
+                self.store.update_flower(flower, quantity, price, expiry, threshold)
                 
                 self.update_inventory_display()
                 self.check_alerts()
@@ -564,20 +3168,64 @@ class ModernFlowerInventory:
         save_btn = ttk.Button(frame, text="Save Changes", command=save_changes, style="Accent.TButton")
         save_btn.pack(pady=20)
     
+    def update_prices(self, flowers):
+        price_window = tk.Toplevel(self.root)
+        price_window.title("Update Prices")
+        price_window.geometry("400x300")
+        
+        frame = ttk.Frame(price_window, style="Card.TFrame")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        ttk.Label(frame, text=f"Update {len(flowers)} Flowers", font=("Segoe UI", 14, "bold"), 
+                 background=self.card_color).pack(pady=10)
+        
+        mode_var = tk.StringVar(value="percent")
+        ttk.Radiobutton(frame, text="Change price by (%)", variable=mode_var, value="percent").pack(anchor="w", padx=20)
+        ttk.Radiobutton(frame, text="Set price to ($)", variable=mode_var, value="price").pack(anchor="w", padx=20)
+        
+        value_var = tk.DoubleVar(value=10)
+        ttk.Spinbox(frame, from_=-99, to=1000, increment=0.5, textvariable=value_var).pack(fill="x", padx=20, pady=10)
+        
+        def save_prices():
+            try:
+                value = value_var.get()
+                if mode_var.get() == "percent":
+                    self.store.set_prices(flowers, percent=value)
+                else:
+                    self.store.set_prices(flowers, price=value)
+            except (ValueError, tk.TclError) as e:
+                messagebox.showerror("Error", f"Invalid input: {str(e)}")
+                return
+            
+            self.refresh_inventory_rows(flowers)
+            price_window.destroy()
+            self.show_notification(f"Updated prices for {len(flowers)} flowers")
+        
+        save_btn = ttk.Button(frame, text="Save Prices", command=save_prices, style="Accent.TButton")
+        save_btn.pack(pady=20)
+    
     def delete_flower(self):
-        selected = self.inventory_tree.focus()
-        if not selected:
+        # Rows are keyed by flower name
+        flowers = list(self.inventory_tree.selection())
+        if not flowers:
             messagebox.showerror("Error", "Please select a flower to delete")
             return
         
-        flower = self.inventory_tree.item(selected)["values"][0]
+        if len(flowers) == 1:
+            prompt = f"Are you sure you want to delete {flowers[0]}?"
+        else:
+            prompt = f"Are you sure you want to delete {len(flowers)} flowers?"
         
-        if messagebox.askyesno("Confirm", f"Are you sure you want to delete {flower}?", icon="warning"):
-            del self.flowers[flower]
-            del self.sales_data[flower]
+        if messagebox.askyesno("Confirm", prompt, icon="warning"):
+            self.store.delete_flowers(flowers)
+            for flower in flowers:
+                self.evaporation.forget(flower)
             self.update_inventory_display()
             self.update_analytics_plot()
-            self.show_notification(f"{flower} has been deleted")
+            if len(flowers) == 1:
+                self.show_notification(f"{flowers[0]} has been deleted")
+            else:
+                self.show_notification(f"{len(flowers)} flowers have been deleted")
     
     def restock_flowers(self):
         restock_window = tk.Toplevel(self.root)
@@ -600,20 +3248,24 @@ class ModernFlowerInventory:
         
         self.restock_listbox = tk.Listbox(list_frame, bg=self.card_color, fg=self.text_color, 
                                         selectbackground=self.primary_color, selectforeground="white",
-                                        font=("Segoe UI", 10))
+                                        font=("Segoe UI", 10), selectmode="extended")
         self.restock_listbox.pack(side="left", fill="both", expand=True, padx=(0, 5))
         
         scrollbar = ttk.Scrollbar(list_frame, orient="vertical", command=self.restock_listbox.yview)
         self.restock_listbox.configure(yscrollcommand=scrollbar.set)
         scrollbar.pack(side="right", fill="y")
         
-        # Find flowers that need restocking (quantity <= threshold)
+        # Find flowers that need restocking (quantity <= threshold); any that
+        # are selected in the inventory start out selected here
         self.need_restock = []
+        tree_selection = set(self.inventory_tree.selection())
         for flower, data in self.flowers.items():
             if data["quantity"] <= data["threshold"]:
                 self.need_restock.append(flower)
                 self.restock_listbox.insert("end", 
                                           f"{flower} (Current: {data['quantity']}, Threshold: {data['threshold']})")
+                if flower in tree_selection:
+                    self.restock_listbox.selection_set("end")
         
         if not self.need_restock:
             self.restock_listbox.insert("end", "No flowers currently need restocking!")
@@ -624,33 +3276,77 @@ class ModernFlowerInventory:
         control_frame = ttk.Frame(frame, style="Custom.TFrame")
         control_frame.pack(fill="x", pady=10)
         
-        ttk.Label(control_frame, text="Restock Quantity:", background=self.card_color).pack(side="left", padx=5)
+        # Either add a fixed amount to each flower or fill each up to a target
+        self.restock_mode_var = tk.StringVar(value="add")
+        ttk.Radiobutton(control_frame, text="Add", variable=self.restock_mode_var,
+                        value="add").pack(side="left", padx=5)
+        ttk.Radiobutton(control_frame, text="Up to", variable=self.restock_mode_var,
+                        value="target").pack(side="left", padx=5)
         
         self.restock_qty_var = tk.IntVar(value=50)
         self.restock_qty = ttk.Spinbox(control_frame, from_=1, to=1000, textvariable=self.restock_qty_var)
         self.restock_qty.pack(side="left", padx=5, fill="x", expand=True)
         
-        def perform_restock():
-            selected = self.restock_listbox.curselection()
-            if not selected:
+        # Each delivery is its own lot with its own expiry date
+        expiry_frame = ttk.Frame(frame, style="Custom.TFrame")
+        expiry_frame.pack(fill="x", pady=5)
+        
+        ttk.Label(expiry_frame, text="Expiry Date (YYYY-MM-DD):", background=self.card_color).pack(side="left", padx=5)
+        
+        self.restock_expiry_var = tk.StringVar(
+            value=(datetime.now() + timedelta(days=DEFAULT_SHELF_LIFE_DAYS)).strftime("%Y-%m-%d"))
+        ttk.Entry(expiry_frame, textvariable=self.restock_expiry_var).pack(side="left", padx=5, fill="x", expand=True)
+        
+        def perform_restock(flowers):
+            if not flowers:
                 messagebox.showerror("Error", "Please select a flower to restock")
                 return
             
-            flower = self.need_restock[selected[0]]
-            quantity = self.restock_qty_var.get()
+            try:
+                amount = self.restock_qty_var.get()
+            except tk.TclError:
+                messagebox.showerror("Error", "Invalid quantity entered")
+                return
             
-            if quantity <= 0:
+            if amount <= 0:
                 messagebox.showerror("Error", "Quantity must be positive")
                 return
             
-            self.flowers[flower]["quantity"] += quantity
-            self.update_inventory_display()
+            # One transaction and one refresh for the whole batch. "Up to"
+            # shortfalls are worked out by the store under its locks, so a POS
+            # sale landing meanwhile cannot skew the fill.
+            try:
+                quantities = self.store.restock_many({flower: amount for flower in flowers},
+                                                     self.restock_expiry_var.get(),
+                                                     target=self.restock_mode_var.get() != "add")
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid input: {str(e)}")
+                return
+            
+            if not quantities:
+                messagebox.showinfo("Info", f"Selected flowers already have {amount} or more in stock")
+                return
+            
+            self.refresh_inventory_rows(quantities)
             self.check_alerts()
             restock_window.destroy()
-            self.show_notification(f"Restocked {flower} with {quantity} units")
+            if len(quantities) == 1:
+                flower, quantity = next(iter(quantities.items()))
+                self.show_notification(f"Restocked {flower} with {quantity} units")
+            else:
+                self.show_notification(f"Restocked {len(quantities)} flowers with {sum(quantities.values())} units")
         
-        restock_btn = ttk.Button(frame, text="🔄 Restock Selected", command=perform_restock, style="Accent.TButton")
-        restock_btn.pack(pady=10)
+        button_frame = ttk.Frame(frame, style="Custom.TFrame")
+        button_frame.pack(pady=10)
+        
+        restock_btn = ttk.Button(button_frame, text="🔄 Restock Selected", style="Accent.TButton",
+                                 command=lambda: perform_restock(
+                                     [self.need_restock[i] for i in self.restock_listbox.curselection()]))
+        restock_btn.pack(side="left", padx=5)
+        
+        restock_all_btn = ttk.Button(button_frame, text="📦 Restock All Low Stock", style="Accent.TButton",
+                                     command=lambda: perform_restock(list(self.need_restock)))
+        restock_all_btn.pack(side="left", padx=5)
     
     def setup_sales_tab(self):
         # Sales Entry Card
@@ -664,23 +3360,51 @@ class ModernFlowerInventory:
         form_frame = ttk.Frame(entry_card, style="Custom.TFrame")
         form_frame.pack(fill="x", pady=5)
         
-        ttk.Label(form_frame, text="Flower:", background=self.card_color).grid(row=0, column=0, padx=5, sticky="w")
+        # Picture of the selected flower
+        self.sale_thumbnail = ttk.Label(form_frame, background=self.card_color)
+        self.sale_thumbnail.grid(row=0, column=0, padx=5)
+        
+        ttk.Label(form_frame, text="Flower:", background=self.card_color).grid(row=0, column=1, padx=5, sticky="w")
         self.flower_var = tk.StringVar()
         self.flower_dropdown = ttk.Combobox(form_frame, textvariable=self.flower_var, 
                                           values=list(self.flowers.keys()), state="readonly")
-        self.flower_dropdown.grid(row=0, column=1, padx=5, sticky="ew")
+        self.flower_dropdown.grid(row=0, column=2, padx=5, sticky="ew")
+        self.flower_dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_sale_thumbnail())
         self.flower_dropdown.current(0)
         
-        ttk.Label(form_frame, text="Quantity:", background=self.card_color).grid(row=0, column=2, padx=5, sticky="w")
+        ttk.Label(form_frame, text="Quantity:", background=self.card_color).grid(row=0, column=3, padx=5, sticky="w")
         self.quantity_var = tk.IntVar(value=1)
         self.quantity_entry = ttk.Spinbox(form_frame, from_=1, to=100, textvariable=self.quantity_var, width=8)
-        self.quantity_entry.grid(row=0, column=3, padx=5, sticky="ew")
+        self.quantity_entry.grid(row=0, column=4, padx=5, sticky="ew")
         
         record_btn = ttk.Button(form_frame, text="💾 Record Sale", command=self.record_sale, style="Accent.TButton")
-        record_btn.grid(row=0, column=4, padx=5, sticky="ew")
+        record_btn.grid(row=0, column=5, padx=5, sticky="ew")
+        
+        form_frame.columnconfigure(2, weight=1)
+        form_frame.columnconfigure(4, weight=1)
+        self.update_sale_thumbnail()
         
-        form_frame.columnconfigure(1, weight=1)
-        form_frame.columnconfigure(3, weight=1)
+        # Scanner checkout: each scan (code + Enter) goes into a basket held
+        # apart from the inventory; Enter on an empty line or F12 sells it in
+        # one go and Escape empties it. "3*1001" scans three at once.
+        scan_card = ttk.Frame(self.sales_tab, style="Card.TFrame")
+        scan_card.pack(fill="x", pady=(0, 10), padx=10)
+        
+        ttk.Label(scan_card, text="🔎 Scan Checkout", font=("Segoe UI", 12, "bold"), 
+                 background=self.card_color).pack(pady=(5, 10), fill="x")
+        
+        self.scan_basket = Counter()
+        self.scan_var = tk.StringVar()
+        self.scan_entry = ttk.Entry(scan_card, textvariable=self.scan_var, font=("Segoe UI", 12))
+        self.scan_entry.pack(fill="x", padx=10)
+        self.scan_entry.bind("<Return>", self.on_scan)
+        self.scan_entry.bind("<KP_Enter>", self.on_scan)
+        self.scan_entry.bind("<F12>", lambda e: self.commit_scan_basket())
+        self.scan_entry.bind("<Escape>", lambda e: self.clear_scan_basket())
+        
+        self.scan_status = ttk.Label(scan_card, text="Basket empty", background=self.card_color,
+                                     font=("Segoe UI", 10), wraplength=900, justify="left")
+        self.scan_status.pack(fill="x", padx=10, pady=5)
         
         # Sales History Card
         history_card = ttk.Frame(self.sales_tab, style="Card.TFrame")
@@ -721,33 +3445,13 @@ class ModernFlowerInventory:
             if quantity <= 0:
                 messagebox.showerror("Error", "Quantity must be positive")
                 return
-                
-            if self.flowers[flower]["quantity"] < quantity:
-                messagebox.showerror("Error", "Not enough stock available")
-                return
-                
-            # Update inventory
-            self.flowers[flower]["quantity"] -= quantity
-            
-            # Update sales data (keeping last 5 days)
-            self.sales_data[flower].append(quantity)
-            if len(self.sales_data[flower]) > 5:
-                self.sales_data[flower] = self.sales_data[flower][-5:]
             
-            # Record sale in history
-            price = self.flowers[flower]["price"]
-            total = price * quantity
-            condition = self.flowers[flower]["condition"]
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M")
-            
-            self.sales_history.append({
-                "date": current_time,
-                "flower": flower,
-                "quantity": quantity,
-                "price": price,
-                "total": total,
-                "condition": condition
-            })
+            # Update inventory, sales data and history in one step
+            try:
+                sale = self.store.sell(flower, quantity)
+            except OutOfStockError as e:
+                messagebox.showerror("Error", str(e))
+                return
             
             # Update displays
             self.update_inventory_display()
@@ -756,18 +3460,97 @@ class ModernFlowerInventory:
             self.check_alerts()
             
             # Show notification
-            self.show_notification(f"Recorded sale: {quantity} {flower}(s) for ${total:.2f}")
+            self.show_notification(f"Recorded sale: {quantity} {flower}(s) for ${sale['total']:.2f}",
+                                   key="sale", summary="Recorded {count} sales")
             
         except ValueError:
             messagebox.showerror("Error", "Invalid quantity entered")
     
+    def on_scan(self, event=None):
+        # Kept to a dict lookup and one label update per scan; the inventory
+        # and charts are only refreshed when the basket is sold
+        code = self.scan_var.get().strip()
+        self.scan_var.set("")
+        if not code:
+            self.commit_scan_basket()
+            return
+        
+        count, _, sku = code.rpartition("*")
+        try:
+            count = int(count) if count else 1
+        except ValueError:
+            count = 0
+        
+        flower = self.store.lookup_sku(sku)
+        if flower is None or count <= 0:
+            self.root.bell()
+            self.update_scan_status(f"Unknown code: {code}")
+            return
+        
+        if self.scan_basket[flower] + count > self.flowers[flower]["quantity"]:
+            self.root.bell()
+            self.update_scan_status(f"Only {self.flowers[flower]['quantity']} {flower}(s) in stock")
+            return
+        
+        self.scan_basket[flower] += count
+        self.update_scan_status()
+    
+    def update_scan_status(self, problem=None):
+        if self.scan_basket:
+            items = ", ".join(f"{flower} ×{count}" for flower, count in self.scan_basket.items())
+            total = sum(self.flowers[flower]["price"] * count for flower, count in self.scan_basket.items()
+                        if flower in self.flowers)
+            text = f"{items} — ${total:.2f}"
+        else:
+            text = "Basket empty"
+        if problem:
+            text = f"⚠️ {problem}\n{text}"
+        self.scan_status.config(text=text)
+    
+    def clear_scan_basket(self):
+        self.scan_basket.clear()
+        self.update_scan_status()
+    
+    def commit_scan_basket(self):
+        if not self.scan_basket:
+            return
+        
+        # The whole basket is one transaction: all of it sells or none does
+        try:
+            records = self.store.sell_basket(self.scan_basket.items())
+        except OutOfStockError as e:
+            self.root.bell()
+            self.update_scan_status(str(e))
+            return
+        except KeyError as e:
+            # A flower deleted since it was scanned; drop its line so the
+            # rest of the basket can still be sold
+            flower = e.args[0]
+            self.scan_basket.pop(flower, None)
+            self.root.bell()
+            self.update_scan_status(f"{flower} is no longer in the inventory")
+            return
+        
+        flowers = list(self.scan_basket)
+        self.scan_basket.clear()
+        self.update_scan_status()
+        
+        self.refresh_inventory_rows(flowers)
+        self.update_sales_history()
+        self.update_analytics_plot()
+        self.check_alerts()
+        
+        total = sum(record["total"] for record in records)
+        self.show_notification(f"Recorded sale: {sum(record['quantity'] for record in records)} item(s) "
+                               f"for ${total:.2f}", key="sale", summary="Recorded {count} sales")
+    
     def update_sales_history(self):
         # Clear existing data
         for item in self.sales_tree.get_children():
             self.sales_tree.delete(item)
         
         # Add sales entries in reverse chronological order
-        for entry in reversed(self.sales_history[-50:]):  # Show last 50 entries
+        for entry in reversed(self.sales_history.tail(50)):  # Show last 50 entries
             self.sales_tree.insert("", "end", values=(
                 entry["date"],
                 entry["flower"],
@@ -813,14 +3596,17 @@ class ModernFlowerInventory:
     def auto_adjust_inventory(self, predictions):
         adjustments = []
         
+        # Top everything up in one transaction; the store works out each
+        # shortfall under its locks
+        added = self.store.restock_many({flower: pred for flower, pred in predictions.items() if pred > 0},
+                                        target=True)
+        
         for flower, pred in predictions.items():
             current = self.flowers[flower]["quantity"]
             threshold = self.flowers[flower]["threshold"]
             
-            if current < pred:
-                needed = pred - current
-                self.flowers[flower]["quantity"] += needed
-                adjustments.append(f"➕ Added {needed} {flower}(s) to meet predicted demand")
+            if flower in added:
+                adjustments.append(f"➕ Added {added[flower]} {flower}(s) to meet predicted demand")
             elif current > pred * 1.5:  # If we have much more than needed
                 excess = current - pred
                 adjustments.append(f"⚠️ Consider reducing {flower} stock (current: {current}, predicted need: {pred})")
@@ -875,6 +3661,24 @@ class ModernFlowerInventory:
         sales_tab = ttk.Frame(self.analytics_notebook, style="Custom.TFrame")
         self.analytics_notebook.add(sales_tab, text="💰 Sales Trends")
         
+        # Time range and number of flowers shown
+        sales_controls = ttk.Frame(sales_tab, style="Custom.TFrame")
+        sales_controls.pack(fill="x", pady=5)
+        
+        ttk.Label(sales_controls, text="Range:").pack(side="left", padx=5)
+        self.sales_range_var = tk.StringVar(value=DEFAULT_SALES_TREND_RANGE)
+        sales_range = ttk.Combobox(sales_controls, textvariable=self.sales_range_var,
+                                   values=list(SALES_TREND_RANGES.keys()), state="readonly", width=8)
+        sales_range.pack(side="left", padx=5)
+        sales_range.bind("<<ComboboxSelected>>", lambda e: self.update_sales_chart())
+        
+        ttk.Label(sales_controls, text="Top flowers:").pack(side="left", padx=5)
+        self.sales_top_var = tk.IntVar(value=DEFAULT_SALES_TREND_TOP_N)
+        sales_top = ttk.Combobox(sales_controls, textvariable=self.sales_top_var,
+                                 values=SALES_TREND_TOP_N, state="readonly", width=5)
+        sales_top.pack(side="left", padx=5)
+        sales_top.bind("<<ComboboxSelected>>", lambda e: self.update_sales_chart())
+        
         # Create figure for sales analytics
         self.sales_fig, self.sales_ax = plt.subplots(figsize=(10, 5))
         self.sales_fig.patch.set_facecolor(self.bg_color)
@@ -893,148 +3697,433 @@ class ModernFlowerInventory:
         self.water_canvas = FigureCanvasTkAgg(self.water_fig, master=water_tab)
         self.water_canvas.get_tk_widget().pack(fill="both", expand=True)
         
+        # Stock levels and watering frequency over time as heatmaps
+        history_tab = ttk.Frame(self.analytics_notebook, style="Custom.TFrame")
+        self.analytics_notebook.add(history_tab, text="🗓️ History")
+        
+        history_controls = ttk.Frame(history_tab, style="Custom.TFrame")
+        history_controls.pack(fill="x", pady=5)
+        
+        self.history_view_var = tk.StringVar(value="Stock Levels")
+        self.history_range_var = tk.StringVar(value=DEFAULT_ANALYTICS_RANGE)
+        self.history_bucket_var = tk.StringVar(value=DEFAULT_ANALYTICS_BUCKET)
+        for text, var, values in (("View:", self.history_view_var, ["Stock Levels", "Watering Frequency"]),
+                                  ("Range:", self.history_range_var, list(ANALYTICS_RANGES.keys())),
+                                  ("Per:", self.history_bucket_var, list(ANALYTICS_BUCKETS.keys()))):
+            ttk.Label(history_controls, text=text).pack(side="left", padx=5)
+            dropdown = ttk.Combobox(history_controls, textvariable=var, values=values, state="readonly", width=18)
+            dropdown.pack(side="left", padx=5)
+            dropdown.bind("<<ComboboxSelected>>", lambda e: self.update_history_chart())
+        
+        self.history_fig = plt.figure(figsize=(10, 5))
+        self.history_fig.patch.set_facecolor(self.bg_color)
+        
+        self.history_canvas = FigureCanvasTkAgg(self.history_fig, master=history_tab)
+        self.history_canvas.get_tk_widget().pack(fill="both", expand=True)
+        
+        # Export the current charts as images
+        ttk.Button(self.analytics_tab, text="🖼️ Save Charts", command=self.save_charts,
+                  style="Accent.TButton").pack(pady=(0, 10))
+        
+        # Charts are only redrawn while on screen; one that changed while
+        # hidden is redrawn when its tab is shown
+        self.chart_pages = {str(stock_tab): self.draw_stock_chart, str(sales_tab): self.draw_sales_chart,
+                            str(water_tab): self.draw_watering_chart, str(history_tab): self.draw_history_chart}
+        self.stale_charts = set()
+        self.analytics_notebook.bind("<<NotebookTabChanged>>", lambda e: self.draw_stale_charts())
+        self.tab_control.bind("<<NotebookTabChanged>>", lambda e: self.draw_stale_charts())
+        
         # Initial plots
         self.update_analytics_plot()
 
     def update_analytics_plot(self):
-        # Update stock levels plot
+        # Called after every sale, watering and restock. Sales Trends and
+        # History scan the logs, so hidden charts are only marked out of date.
+        self.stale_charts.update(self.chart_pages)
+        self.draw_stale_charts()
+    
+    def draw_stale_charts(self):
+        if str(self.tab_control.select()) != str(self.analytics_tab):
+            return
+        page = str(self.analytics_notebook.select())
+        if page in self.stale_charts:
+            self.stale_charts.discard(page)
+            with plt.rc_context(THEME_RC[self.theme]):
+                self.chart_pages[page]()
+    
+    def draw_stock_chart(self):
         self.stock_ax.clear()
-        
-        flowers = list(self.flowers.keys())
-        quantities = [data["quantity"] for data in self.flowers.values()]
-        thresholds = [data["threshold"] for data in self.flowers.values()]
-        
-        x = range(len(flowers))
-        bar_width = 0.35
-        
-        # Stock levels bars
-        bars = self.stock_ax.bar(x, quantities, bar_width, color=self.primary_color, label='Current Stock')
-        threshold_bars = self.stock_ax.bar([i + bar_width for i in x], thresholds, bar_width, 
-                                         color=self.secondary_color, label='Restock Threshold')
-        
-        self.stock_ax.set_title("Current Stock vs Restock Threshold", color=self.text_color)
-        self.stock_ax.set_xticks([i + bar_width / 2 for i in x])
-        self.stock_ax.set_xticklabels(flowers, rotation=45, ha="right")
-        self.stock_ax.legend()
-        
-        # Add value labels on bars
-        for bar in bars + threshold_bars:
-            height = bar.get_height()
-            self.stock_ax.text(bar.get_x() + bar.get_width()/2., height,
-                              f'{int(height)}',
-                              ha='center', va='bottom', color=self.text_color)
-        
-        # Style the plot
-        self.stock_ax.set_facecolor(self.card_color)
-        for spine in self.stock_ax.spines.values():
-            spine.set_edgecolor(self.text_color)
-        self.stock_ax.tick_params(colors=self.text_color)
-        self.stock_ax.yaxis.label.set_color(self.text_color)
-        self.stock_ax.xaxis.label.set_color(self.text_color)
-        self.stock_ax.title.set_color(self.text_color)
-        
+        draw_stock_chart(self.stock_ax, self.flowers, self.chart_colors())
         self.stock_fig.tight_layout()
         self.stock_canvas.draw()
-        
-        # Update sales trends plot
+    
+    def draw_watering_chart(self):
+        self.water_ax.clear()
+        draw_watering_chart(self.water_ax, self.watering_history.tail(50), self.flowers, self.chart_colors())
+        self.water_fig.tight_layout()
+        self.water_canvas.draw()
+    
+    def update_sales_chart(self):
+        with plt.rc_context(THEME_RC[self.theme]):
+            self.draw_sales_chart()
+    
+    def draw_sales_chart(self):
         self.sales_ax.clear()
+        series, title = sales_trend_series(self.sales_history, self.sales_range_var.get(),
+                                           self.sales_top_var.get())
+        draw_sales_chart(self.sales_ax, series, self.chart_colors(), title)
+        self.sales_fig.tight_layout()
+        self.sales_canvas.draw()
+    
+    def update_history_chart(self):
+        with plt.rc_context(THEME_RC[self.theme]):
+            self.draw_history_chart()
+    
+    def draw_history_chart(self):
+        # The colorbar adds an axes of its own, so start from an empty figure
+        self.history_fig.clear()
+        ax = self.history_fig.add_subplot()
+        draw_history_chart(ax, self.store, self.history_view_var.get(), self.history_range_var.get(),
+                           self.history_bucket_var.get(), self.chart_colors())
+        self.history_fig.tight_layout()
+        self.history_canvas.draw()
+    
+    def chart_colors(self):
+        return {
+            "primary": self.primary_color,
+            "secondary": self.secondary_color,
+            "background": self.bg_color,
+            "card": self.card_color,
+            "text": self.text_color,
+        }
+    
+    def save_charts(self):
+        directory = filedialog.askdirectory(title="Save charts to")
+        if not directory:
+            return
         
-        # Prepare sales data for the last 5 days
-        days = [f"Day {i}" for i in range(1, 6)]
+        try:
+            paths = self.chart_renderer.render_all(directory, self.theme)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save charts: {str(e)}")
+            return
+        self.show_notification(f"Saved {len(paths)} charts to {directory}")
+    
+    def show_waste_report(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        expired = list(self.lots.expiring(today))
         
-        for flower, sales in self.sales_data.items():
-            self.sales_ax.plot(days, sales[-5:], marker='o', label=flower)
+        report_window = tk.Toplevel(self.root)
+        report_window.title("Waste Report")
+        report_window.geometry("500x400")
         
-        self.sales_ax.set_title("Sales Trends (Last 5 Days)", color=self.text_color)
-        self.sales_ax.legend()
-        self.sales_ax.grid(True, linestyle='--', alpha=0.7)
+        frame = ttk.Frame(report_window, style="Card.TFrame")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
         
-        # Style the plot
-        self.sales_ax.set_facecolor(self.card_color)
-        for spine in self.sales_ax.spines.values():
-            spine.set_edgecolor(self.text_color)
-        self.sales_ax.tick_params(colors=self.text_color)
-        self.sales_ax.yaxis.label.set_color(self.text_color)
-        self.sales_ax.xaxis.label.set_color(self.text_color)
-        self.sales_ax.title.set_color(self.text_color)
+        ttk.Label(frame, text="♻️ Waste Report", font=("Segoe UI", 14, "bold"), 
+                 background=self.card_color).pack(pady=10)
         
-        self.sales_fig.tight_layout()
-        self.sales_canvas.draw()
+        text = tk.Text(frame, wrap="word", bg=self.card_color, fg=self.text_color,
+                      font=("Segoe UI", 10), padx=10, pady=10)
+        text.pack(fill="both", expand=True)
         
-        # Update watering history plot
-        self.water_ax.clear()
+        total_value = 0
+        for lot in expired:
+            value = lot.quantity * self.flowers[lot.flower]["price"]
+            total_value += value
+            text.insert("end", f"• {lot.flower}: {lot.quantity} unit(s) expired {lot.expiry} (${value:.2f})\n")
         
-        if self.watering_history:
-            # Prepare data for last 7 days
-            today = datetime.now()
-            dates = [today - timedelta(days=i) for i in range(6, -1, -1)]
-            flower_counts = {flower: [0]*7 for flower in self.flowers.keys()}
-            
-            for entry in self.watering_history[-50:]:  # Consider last 50 entries
-                entry_date = datetime.strptime(entry["time"], "%Y-%m-%d %H:%M")
-                for i, date in enumerate(dates):
-                    if entry_date.date() == date.date():
-                        flower_counts[entry["flower"]][i] += 1
-                        break
-            
-            bottom = [0]*7
-            for flower in self.flowers.keys():
-                counts = flower_counts[flower]
-                if sum(counts) > 0:  # Only show flowers with watering activity
-                    self.water_ax.bar([d.strftime("%a") for d in dates], counts, 
-                                     bottom=bottom, label=flower)
-                    bottom = [bottom[j] + counts[j] for j in range(7)]
-            
-            self.water_ax.set_title("Watering Activity (Last 7 Days)", color=self.text_color)
-            self.water_ax.legend()
-        
-        # Style the plot
-        self.water_ax.set_facecolor(self.card_color)
-        for spine in self.water_ax.spines.values():
-            spine.set_edgecolor(self.text_color)
-        self.water_ax.tick_params(colors=self.text_color)
-        self.water_ax.yaxis.label.set_color(self.text_color)
-        self.water_ax.xaxis.label.set_color(self.text_color)
-        self.water_ax.title.set_color(self.text_color)
+        if expired:
+            text.insert("end", f"\nTotal waste value: ${total_value:.2f}\n")
+        else:
+            text.insert("end", "No expired stock 🎉\n")
+        text.config(state="disabled")
         
-        self.water_fig.tight_layout()
-        self.water_canvas.draw()
-
-    def check_alerts(self):
+        def discard():
+            discarded = self.store.discard_expired(today)
+            flowers = {flower for flower, _, _ in discarded}
+            self.refresh_inventory_rows(flowers)
+            self.check_alerts()
+            report_window.destroy()
+            self.show_notification(f"Discarded {sum(qty for _, qty, _ in discarded)} expired unit(s)")
+        
+        if expired:
+            ttk.Button(frame, text="🗑️ Discard Expired", command=discard,
+                      style="Accent.TButton").pack(pady=10)
+    
+    def check_alerts(self, flowers=None):
+        # Stock and water alerts are worked out again for `flowers` only, or
+        # for every flower when it is None
         alerts = []
         today = datetime.now()
         
-        # Check expiry alerts
-        for flower, data in self.flowers.items():
-            expiry_date = datetime.strptime(data["expiry"], "%Y-%m-%d")
-            days_left = (expiry_date - today).days
+        # Check expiry alerts; the expiry heap yields only lots due within two
+        # days, so this does not scan the whole inventory
+        horizon = (today + timedelta(days=2)).strftime("%Y-%m-%d")
+        expiring = {}
+        for lot in self.lots.expiring(horizon):
+            soonest, quantity = expiring.get(lot.flower, (lot.expiry, 0))
+            expiring[lot.flower] = (soonest, quantity + lot.quantity)
+        
+        for flower, (expiry, quantity) in expiring.items():
+            days_left = (datetime.strptime(expiry, "%Y-%m-%d").date() - today.date()).days
             
             if days_left <= 0:
-                alerts.append(f"⛔ {flower} has expired!")
-            elif days_left <= 2:
-                alerts.append(f"⚠️ {flower} expires in {days_left} day(s)")
+                alerts.append(f"⛔ {flower} has expired! ({quantity} unit(s))")
+            else:
+                alerts.append(f"⚠️ {quantity} {flower}(s) expire in {days_left} day(s)")
         
-        # Check low stock alerts
-        for flower, data in self.flowers.items():
-            if data["quantity"] <= data["threshold"]:
-                alerts.append(f"📉 {flower} stock is low ({data['quantity']} left, threshold: {data['threshold']})")
+        if flowers is None:
+            self.stock_alerts.clear()
+            self.water_alerts.clear()
+            flowers = self.flowers
         
-        # Check water alerts
-        for flower, data in self.flowers.items():
-            if data["water_level"] < 20:
-                alerts.append(f"💧 CRITICAL: {flower} needs immediate watering! (Level: {data['water_level']}%)")
-            elif data["water_level"] < 40:
-                alerts.append(f"💧 Warning: {flower} needs watering soon (Level: {data['water_level']}%)")
+        for flower in flowers:
+            data = self.flowers.get(flower)
+            
+            # Check low stock alerts
+            if data is not None and data["quantity"] <= data["threshold"]:
+                self.stock_alerts[flower] = (f"📉 {flower} stock is low ({data['quantity']} left, "
+                                             f"threshold: {data['threshold']})")
+            else:
+                self.stock_alerts.pop(flower, None)
+            
+            # Check water alerts
+            if data is not None and data["water_level"] < 20:
+                self.water_alerts[flower] = (f"💧 CRITICAL: {flower} needs immediate watering! "
+                                             f"(Level: {data['water_level']}%)")
+            elif data is not None and data["water_level"] < 40:
+                self.water_alerts[flower] = f"💧 Warning: {flower} needs watering soon (Level: {data['water_level']}%)"
+            else:
+                self.water_alerts.pop(flower, None)
+        
+        alerts.extend(self.stock_alerts.values())
+        alerts.extend(self.water_alerts.values())
         
         if alerts:
             self.alerts_label.config(text="\n".join(alerts), foreground="white")
         else:
             self.alerts_label.config(text="✅ No alerts at this time", foreground="#4CAF50")
 
-    def show_notification(self, message):
-        self.status_label.config(text=message)
-        self.root.after(5000, lambda: self.status_label.config(text="Ready"))
+    def show_notification(self, message, key=None, summary=None):
+        self.notifications.post(message, key, summary)
+    
+    def show_notification_history(self):
+        history_window = tk.Toplevel(self.root)
+        history_window.title("Notifications")
+        history_window.geometry("500x400")
+        
+        frame = ttk.Frame(history_window, style="Card.TFrame")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        text = tk.Text(frame, wrap="word", bg=self.card_color, fg=self.text_color,
+                      font=("Segoe UI", 10), padx=10, pady=10)
+        text.pack(fill="both", expand=True)
+        
+        entries = self.notifications.recent()
+        for posted, message in reversed(entries):
+            text.insert("end", f"{posted.strftime('%H:%M:%S')}  {message}\n")
+        if not entries:
+            text.insert("end", "No notifications yet\n")
+        if self.notifications.dropped:
+            text.insert("end", f"\n{self.notifications.dropped} notification(s) dropped while busy\n")
+        text.config(state="disabled")
 
+    def export_data(self):
+        if self.export_thread is not None and self.export_thread.is_alive():
+            messagebox.showinfo("Export", "An export is already running")
+            return
+        
+        export_window = tk.Toplevel(self.root)
+        export_window.title("Export Data")
+        export_window.geometry("400x380")
+        
+        frame = ttk.Frame(export_window, style="Card.TFrame")
+        frame.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        ttk.Label(frame, text="Export Data", font=("Segoe UI", 14, "bold"), 
+                 background=self.card_color).pack(pady=10)
+        
+        ttk.Label(frame, text="Dataset:", background=self.card_color).pack(pady=(10, 0))
+        dataset_var = tk.StringVar(value="Sales History")
+        ttk.Combobox(frame, textvariable=dataset_var, values=list(EXPORT_FIELDS.keys()),
+                     state="readonly").pack(fill="x", padx=20)
+        
+        ttk.Label(frame, text="Format:", background=self.card_color).pack(pady=(10, 0))
+        formats = ["CSV", "Parquet"] if pa is not None else ["CSV"]
+        format_var = tk.StringVar(value="CSV")
+        ttk.Combobox(frame, textvariable=format_var, values=formats,
+                     state="readonly").pack(fill="x", padx=20)
+        
+        # Optional date range (history datasets only)
+        ttk.Label(frame, text="From (YYYY-MM-DD, optional):", background=self.card_color).pack(pady=(10, 0))
+        start_var = tk.StringVar()
+        ttk.Entry(frame, textvariable=start_var).pack(fill="x", padx=20)
+        
+        ttk.Label(frame, text="To (YYYY-MM-DD, optional):", background=self.card_color).pack(pady=(10, 0))
+        end_var = tk.StringVar()
+        ttk.Entry(frame, textvariable=end_var).pack(fill="x", padx=20)
+        
+        def start_export():
+            dataset = dataset_var.get()
+            fmt = format_var.get()
+            start = start_var.get().strip() or None
+            end = end_var.get().strip() or None
+            
+            try:
+                for value in (start, end):
+                    if value:
+                        datetime.strptime(value, "%Y-%m-%d")
+            except ValueError as e:
+                messagebox.showerror("Error", f"Invalid date: {str(e)}")
+                return
+            
+            extension = ".parquet" if fmt == "Parquet" else ".csv"
+            path = filedialog.asksaveasfilename(
+                parent=export_window, defaultextension=extension,
+                initialfile=dataset.lower().replace(" ", "_") + extension,
+                filetypes=[(fmt, "*" + extension)])
+            if not path:
+                return
+            
+            # Hand the worker a stable view of the data; history logs iterate
+            # over a snapshot and stream spilled segments from disk
+            start_ts = datetime.strptime(start, "%Y-%m-%d").timestamp() if start else None
+            end_ts = (datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1)).timestamp() if end else None
+            if dataset == "Sales History":
+                records = self.sales_history.iter_range(start_ts, end_ts)
+                total = len(self.sales_history)
+            elif dataset == "Watering History":
+                records = self.watering_history.iter_range(start_ts, end_ts)
+                total = len(self.watering_history)
+            else:
+                items = [(flower, dict(data)) for flower, data in self.flowers.items()]
+                records = iter_inventory(items)
+                total = len(items)
+            
+            writer = write_parquet if fmt == "Parquet" else write_csv
+            self.export_thread = threading.Thread(
+                target=self.run_export, args=(writer, path, EXPORT_FIELDS[dataset], records, total),
+                daemon=True)
+            self.export_thread.start()
+            export_window.destroy()
+            self.show_notification(f"Exporting {dataset.lower()}...", key="export")
+            self.root.after(100, self.poll_export)
+        
+        ttk.Button(frame, text="📤 Export", command=start_export, style="Accent.TButton").pack(pady=20)
+    
+    def run_export(self, writer, path, fields, records, total):
+        # Runs on the worker thread; Tk is only touched from poll_export
+        def progress(written):
+            self.export_queue.put(("progress", written, total))
+        
+        try:
+            written = writer(path, fields, iter_chunks(records), progress)
+            self.export_queue.put(("done", written, path))
+        except Exception as e:
+            self.export_queue.put(("error", str(e), path))
+    
+    def poll_export(self):
+        finished = False
+        try:
+            while True:
+                kind, value, extra = self.export_queue.get_nowait()
+                if kind == "progress":
+                    # Filtered exports may finish below 100%, which is fine for a hint
+                    percent = min(100, int(value * 100 / extra)) if extra else 100
+                    self.show_notification(f"Exporting... {value} records ({percent}%)", key="export")
+                elif kind == "done":
+                    self.show_notification(f"Exported {value} records to {extra}", key="export")
+                    finished = True
+                else:
+                    self.show_notification("Export failed", key="export")
+                    messagebox.showerror("Export Failed", value)
+                    finished = True
+        except queue.Empty:
+            pass
+        
+        if not finished:
+            self.root.after(100, self.poll_export)
+    
+    def start_api(self, host="127.0.0.1", port=8765):
+        self.api_server = PosApiServer(self.store, self.api_events, host, port)
+        port = self.api_server.start()
+        self.root.after(200, self.poll_api_events)
+        self.show_notification(f"POS API listening on {host}:{port}")
+    
+    def poll_api_events(self):
+        changes = []
+        try:
+            while True:
+                changes.extend(self.api_events.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if changes:
+            # One refresh for everything the terminals did since the last poll
+            kinds = {kind for kind, _ in changes}
+            flowers = {flower for _, flower in changes}
+            watered = {flower for kind, flower in changes if kind == "water"}
+            
+            if "ALL" in watered:
+                self.evaporation.schedule_all()
+                self.update_inventory_display()
+            else:
+                for flower in watered:
+                    if flower in self.flowers:
+                        self.evaporation.schedule(flower)
+                self.refresh_inventory_rows(flowers)
+            
+            if "sale" in kinds:
+                self.update_sales_history()
+            if "water" in kinds:
+                self.update_watering_history()
+            self.update_analytics_plot()
+            self.check_alerts()
+            self.show_notification(f"Applied {len(changes)} update(s) from POS terminals",
+                                   key="pos", summary="Applied {count} batches of updates from POS terminals")
+        
+        self.root.after(200, self.poll_api_events)
+    
+    def save_snapshot(self):
+        path = filedialog.asksaveasfilename(defaultextension=".bloom", initialfile="inventory.bloom",
+                                            filetypes=[("BloomTrack snapshot", "*.bloom")])
+        if not path:
+            return
+        
+        try:
+            write_snapshot(self.store, path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not save snapshot: {str(e)}")
+            return
+        self.show_notification(f"Snapshot saved to {path}")
+    
+    def open_snapshot(self):
+        path = filedialog.askopenfilename(filetypes=[("BloomTrack snapshot", "*.bloom"), ("All files", "*")])
+        if not path:
+            return
+        if not messagebox.askyesno("Confirm", "Replace the current inventory and history with this snapshot?",
+                                   icon="warning"):
+            return
+        self.load_snapshot(path)
+    
+    def load_snapshot(self, path):
+        try:
+            with SnapshotReader(path) as reader:
+                self.store.load_snapshot(reader)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not open snapshot: {str(e)}")
+            return
+        
+        flowers = list(self.flowers.keys())
+        self.flower_dropdown.configure(values=flowers)
+        self.water_flower_dropdown.configure(values=flowers)
+        
+        self.evaporation.reset()
+        self.clear_scan_basket()
+        self.refresh_data()
+        self.show_notification(f"Loaded {len(flowers)} flowers from {path}")
+    
     def refresh_data(self):
         self.update_inventory_display()
         self.update_sales_history()
@@ -1043,6 +4132,58 @@ class ModernFlowerInventory:
         self.show_notification("Data refreshed")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BloomTrack flower inventory")
+    parser.add_argument("--api-port", type=int, help="serve the POS terminal API on this port")
+    parser.add_argument("--api-host", default="127.0.0.1", help="address for the POS terminal API")
+    parser.add_argument("--stress", action="store_true",
+                        help="run the concurrent sales stress check instead of the UI")
+    parser.add_argument("--render-charts", metavar="DIR",
+                        help="render the analytics charts into DIR without opening the UI")
+    parser.add_argument("--chart-format", choices=("png", "svg"), default="png")
+    parser.add_argument("--theme", choices=("dark", "light"), default="dark")
+    parser.add_argument("--history-dir", metavar="DIR",
+                        help="spill older sales, watering and stock history to segment files in DIR; "
+                             "without it every history log is kept in memory and grows without limit")
+    parser.add_argument("--history-window", type=history_window, default=DEFAULT_HISTORY_WINDOW,
+                        help=f"history records per log kept in memory when --history-dir is set "
+                             f"(at least {MIN_HISTORY_WINDOW}, default {DEFAULT_HISTORY_WINDOW})")
+    parser.add_argument("--snapshot", metavar="PATH", help="open this snapshot on startup")
+    parser.add_argument("--image-dir", metavar="DIR",
+                        help="folder of flower pictures named after each flower (default: ./images)")
+    parser.add_argument("--soak", type=float, metavar="MINUTES",
+                        help="drive the UI through a simulated shop day for MINUTES and report latencies")
+    parser.add_argument("--soak-rate", type=soak_rate, action="append", default=[], metavar="EVENT=PER_MIN",
+                        help=f"override a soak event rate; events: {', '.join(SOAK_RATES)}")
+    parser.add_argument("--soak-seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    if args.render_charts:
+        # Chart the same data the window would open with
+        store = FlowerStore(sample_flowers(), sample_sales_data(), args.history_dir, args.history_window)
+        if args.snapshot:
+            try:
+                with SnapshotReader(args.snapshot) as reader:
+                    store.load_snapshot(reader)
+            except (OSError, ValueError) as e:
+                parser.error(f"could not open snapshot: {e}")
+        renderer = ChartRenderer(store)
+        for path in renderer.render_all(args.render_charts, args.theme, args.chart_format):
+            print(path)
+        raise SystemExit(0)
+    
+    if args.stress:
+        problems = run_sale_stress()
+        for problem in problems:
+            print(problem)
+        raise SystemExit(1 if problems else 0)
+    
+    import_ui()
     root = tk.Tk()
-    app = ModernFlowerInventory(root)
+    app = ModernFlowerInventory(root, args.history_dir, args.history_window, args.image_dir)
+    if args.snapshot:
+        app.load_snapshot(args.snapshot)
+    if args.api_port is not None:
+        app.start_api(args.api_host, args.api_port)
+    if args.soak:
+        SoakTest(app, args.soak, dict(args.soak_rate), args.soak_seed, on_done=root.destroy).start()
     root.mainloop()
\ No newline at end of file